@@ -0,0 +1,73 @@
+"""Micro-benchmark for chooser.parse_intent.
+
+Before timing, it checks that the fuzzy fallback still accepts common typos
+(TYPOS) and still rejects words that are merely close to a label (NEGATIVES).
+A message that is wrongly matched gets an ad or the materials instead of the
+"Unrecognized option" prompt, so a looser rule fails the run.
+
+Run from the repository root: python benchmarks/bench_chooser.py
+"""
+
+from __future__ import annotations
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chooser import _classify, parse_intent  # noqa: E402
+
+CASES = {
+    "button label": "Tutoring consultation",
+    "digit": "2",
+    "chinese": "免费资料",
+    "full-width + punctuation": "  ＦＲＥＥ  Materials！ ",
+    "typo (fuzzy)": "free chinese materails",
+    "unrecognized": "hello, can you help me with my homework?",
+}
+REPEATS = 5
+# cached lookups take ~0.25 us; a few percent of jitter per call is a large share of that
+TOLERANCES = {"cached": 0.6, "uncached": 0.4}
+
+TYPOS = {
+    "free chinese materails": "free_material",
+    "free materils": "free_material",
+    "matrials": "free_material",
+    "consultaion": "consultation",
+    "tutoring consultaton": "consultation",
+    "intrest": "interest",
+    "exam preperation": "exam_prep",
+}
+NEGATIVES = ("internet", "tree", "fred", "freed", "frees", "consulate", "consultant", "examine", "fresh", "interval")
+
+
+def check() -> None:
+    """Raise AssertionError if a typo is no longer matched or a negative word is."""
+    wrong = [f"{text!r} -> {_classify(text)!r}" for text, intent in TYPOS.items() if _classify(text) != intent]
+    wrong += [f"{text!r} -> {_classify(text)!r}" for text in NEGATIVES if _classify(text) != text]
+    if wrong:
+        raise AssertionError("fuzzy matching changed: " + ", ".join(wrong))
+
+
+def _per_call(func, text: str, number: int) -> float:
+    return min(timeit.repeat(lambda: func(text), number=number, repeat=REPEATS)) / number * 1e6
+
+
+def run(number: int = 20000) -> dict[str, dict[str, float]]:
+    """Return the mean cost of one call in microseconds, per case, with and without the LRU."""
+    check()
+    return {
+        name: {"cached": _per_call(parse_intent, text, number), "uncached": _per_call(_classify, text, number)}
+        for name, text in CASES.items()
+    }
+
+
+def main() -> None:
+    print(f"{'case':<28} {'cached':>10} {'uncached':>10}  (us/call)")
+    for name, cost in run().items():
+        print(f"{name:<28} {cost['cached']:10.2f} {cost['uncached']:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""End-to-end load test of BotApp against the fake Bot API (fakeapi.py).
+
+Builds the real Application, points it at a local FakeBotAPI and polls it the
+way run_polling does. USERS simulated users each send /start and, after the
+welcome message arrives, one of INTENT_TEXTS. Up to ACTIVE_USERS are active at
+a time. Reports updates/s and, per step, the p50/p99 time from the update being
+queued to the bot's last expected reply.
+
+State goes to a temporary directory (users.db, bot_state.db), and the startup
+broadcast is skipped. The outbound global rate defaults far above Telegram's
+30 msg/s so the run measures the bot, not the limiter; --global-rate 30 shows
+production pacing.
+
+Run from the repository root:
+    python benchmarks/bench_e2e.py --users 2000 --latency 0.03 --rate-limit 0.001
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+USERS = 2000
+ACTIVE_USERS = 200
+GLOBAL_RATE = 1000.0
+REPLY_TIMEOUT = 30.0
+INTENT_TEXTS = ("1", "2", "Tutoring consultation", "免费资料", "exam prep", "兴趣", "hello")
+# intents answered with the ad plus the materials link; anything else gets one reply
+TWO_REPLY_INTENTS = frozenset({"consultation", "exam_prep", "free_material", "interest"})
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    import outbound
+    from chooser import parse_intent
+    from fakeapi import FakeBotAPI
+    from learning_Chinese_Tutor_Bot import BotApp
+
+    # one INFO line per API call would dominate the run
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    class LoadTestBot(BotApp):
+        async def broadcast_startup(self, bot) -> None:
+            pass
+
+    api = FakeBotAPI(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        retry_after=1,
+        seed=1,
+    )
+    base_url = await api.start()
+    bot_app = LoadTestBot("123456:load-test", base_url=base_url)
+    bot_app.dispatcher = outbound.OutboundDispatcher(global_rate=args.global_rate, workers=args.workers)
+    app = bot_app.build_application()
+
+    await app.initialize()
+    await app.post_init(app)
+    await app.updater.start_polling(poll_interval=0.0, timeout=1)
+    await app.start()
+
+    latencies: dict[str, list[float]] = {"start": [], "intent": []}
+    missing = 0
+    active = asyncio.Semaphore(args.active)
+
+    async def step(user_id: int, text: str, replies: int, name: str) -> None:
+        nonlocal missing
+        outbox = api.outbox(user_id)
+        queued = time.perf_counter()
+        await api.push_text(user_id, text, username=f"user{user_id}")
+        try:
+            for _ in range(replies):
+                await asyncio.wait_for(outbox.get(), REPLY_TIMEOUT)
+        except asyncio.TimeoutError:
+            missing += 1
+            return
+        latencies[name].append(time.perf_counter() - queued)
+
+    async def user(user_id: int) -> None:
+        text = INTENT_TEXTS[user_id % len(INTENT_TEXTS)]
+        replies = 2 if parse_intent(text) in TWO_REPLY_INTENTS else 1
+        async with active:
+            await step(user_id, "/start", 1, "start")
+            await step(user_id, text, replies, "intent")
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(user(uid) for uid in range(1, args.users + 1)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await app.updater.stop()
+        await app.stop()
+        await app.post_stop(app)
+        await app.shutdown()
+        await app.post_shutdown(app)
+        await api.stop()
+
+    result = {
+        "users": args.users,
+        "updates_per_s": 2 * args.users / elapsed,
+        "missing_replies": missing,
+        "api_calls": dict(api.stats),
+    }
+    for name, values in latencies.items():
+        result[f"{name}_p50_ms"] = _percentile(values, 50) * 1000
+        result[f"{name}_p99_ms"] = _percentile(values, 99) * 1000
+    return result
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=USERS)
+    parser.add_argument("--active", type=int, default=ACTIVE_USERS, help="users in a conversation at once")
+    parser.add_argument("--global-rate", type=float, default=GLOBAL_RATE, help="outbound messages per second")
+    parser.add_argument("--workers", type=int, help="outbound dispatcher workers (default: outbound.WORKERS)")
+    parser.add_argument("--latency", type=float, default=0.03, help="fake API latency per call, seconds")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of sends answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of sends answered with 502")
+    return parser.parse_args(argv)
+
+
+def run(argv: list[str] | None = None) -> dict:
+    """Run the load test in a scratch state directory and return its summary."""
+    import outbound
+
+    args = parse_args(argv)
+    if args.workers is None:
+        args.workers = outbound.WORKERS
+    with tempfile.TemporaryDirectory() as state_dir:
+        os.environ["USERS_DB"] = str(Path(state_dir) / "users.db")
+        os.environ["BOT_STATE_DB"] = str(Path(state_dir) / "bot_state.db")
+        os.environ["MATERIALS_MODE"] = "link"
+        return asyncio.run(_run(args))
+
+
+def main() -> None:
+    result = run()
+    print(f"{result['users']} users, {result['updates_per_s']:.1f} updates/s, missing replies: {result['missing_replies']}")
+    for name in ("start", "intent"):
+        print(f"{name:<7} p50 {result[f'{name}_p50_ms']:8.1f} ms   p99 {result[f'{name}_p99_ms']:8.1f} ms")
+    print("API calls:", ", ".join(f"{k}={v}" for k, v in sorted(result["api_calls"].items())))
+
+
+if __name__ == "__main__":
+    main()
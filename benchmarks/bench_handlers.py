@@ -0,0 +1,116 @@
+"""Handler dispatch cost: Application.process_update through BotApp's handlers.
+
+The Bot is backed by fakeapi.InProcessRequest, so every send goes through PTB's
+real request path but is answered by the fake API at function-call cost, with no
+sockets and no latency. Each of USERS users sends /start and then an intent.
+
+"queued" is the production setup: handlers return once replies are queued with
+the outbound dispatcher, which then drains them. "direct" runs without a
+dispatcher, so each handler also waits for its Bot API calls.
+
+Each mode runs REPEATS times on a fresh Application and the best figures are
+kept. State goes to a scratch directory. Run from the repository root:
+    python benchmarks/bench_handlers.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+USERS = 2000
+INTENT_TEXTS = ("1", "2", "Tutoring consultation", "免费资料", "exam prep", "兴趣", "hello")
+REPEATS = 3
+HIGHER_IS_BETTER = frozenset({"replies_per_s"})
+TOLERANCES = {"start_us": 0.4, "intent_us": 0.4, "replies_per_s": 0.3}
+
+
+async def _dispatch(app, updates: list) -> float:
+    started = time.perf_counter()
+    for update in updates:
+        await app.process_update(update)
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+
+async def _run(queued: bool) -> dict[str, float]:
+    import materials
+    import outbound
+    from telegram import Update
+
+    from fakeapi import FakeBotAPI, InProcessRequest, text_update
+    from learning_Chinese_Tutor_Bot import BotApp
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    class BenchBot(BotApp):
+        async def broadcast_startup(self, bot) -> None:
+            pass
+
+    # every repeat sends the Drive link again instead of hitting the last run's dedupe entries
+    materials._recent_sends = None
+    api = FakeBotAPI()
+    bot_app = BenchBot("123456:bench", request=InProcessRequest(api))
+    # no pacing: measure the bot's own cost
+    bot_app.dispatcher = outbound.OutboundDispatcher(global_rate=1e9, per_chat_rate=1e9)
+    app = bot_app.build_application()
+    await app.initialize()
+    await app.post_init(app)
+    if not queued:
+        outbound.install(None)
+    await app.start()
+
+    def updates(text_for) -> list:
+        return [
+            Update.de_json({"update_id": uid, **text_update(uid, text_for(uid), f"user{uid}")}, app.bot)
+            for uid in range(1, USERS + 1)
+        ]
+
+    starts = updates(lambda uid: "/start")
+    intents = updates(lambda uid: INTENT_TEXTS[uid % len(INTENT_TEXTS)])
+    try:
+        started = time.perf_counter()
+        result = {"start_us": await _dispatch(app, starts), "intent_us": await _dispatch(app, intents)}
+        dispatcher = outbound.get_dispatcher()
+        while dispatcher is not None and dispatcher.pending():
+            await asyncio.sleep(0.001)
+        result["replies_per_s"] = api.stats["sendMessage"] / (time.perf_counter() - started)
+    finally:
+        await app.stop()
+        await app.post_stop(app)
+        await app.shutdown()
+        await app.post_shutdown(app)
+    return result
+
+
+def run() -> dict[str, dict[str, float]]:
+    with tempfile.TemporaryDirectory() as state_dir:
+        os.environ["USERS_DB"] = str(Path(state_dir) / "users.db")
+        os.environ["BOT_STATE_DB"] = str(Path(state_dir) / "bot_state.db")
+        os.environ["MATERIALS_MODE"] = "link"
+        results = {}
+        for mode in ("queued", "direct"):
+            runs = [asyncio.run(_run(mode == "queued")) for _ in range(REPEATS)]
+            results[mode] = {
+                metric: (max if metric in HIGHER_IS_BETTER else min)(run[metric] for run in runs) for metric in runs[0]
+            }
+        return results
+
+
+def main() -> None:
+    print(f"{USERS} users, /start then an intent (us per update)")
+    for mode, result in run().items():
+        print(
+            f"{mode:<7} start {result['start_us']:8.1f}   intent {result['intent_us']:8.1f}   "
+            f"replies {result['replies_per_s']:8.0f}/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
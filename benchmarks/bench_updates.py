@@ -0,0 +1,124 @@
+"""Throughput of sequential vs per-user concurrent update processing.
+
+Simulates USERS users each sending UPDATES_PER_USER updates whose handler spends
+HANDLER_LATENCY seconds waiting on the Bot API, and feeds them to an update
+processor the same way Application does (one task per update, in arrival order).
+It also checks that each user's updates finished in order.
+
+The "backlog" case checks fairness: one user queues BACKLOG slow updates, then
+another user sends one, and that user's latency is measured. With per-user
+lanes it should be about one handler's latency, however long the backlog.
+
+Run from the repository root: python benchmarks/bench_updates.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import Chat, Message, Update, User  # noqa: E402
+from telegram.ext import SimpleUpdateProcessor  # noqa: E402
+
+from update_processor import PerUserUpdateProcessor  # noqa: E402
+
+USERS = 200
+UPDATES_PER_USER = 3
+HANDLER_LATENCY = 0.02
+BACKLOG = 40
+BACKLOG_LATENCY = 0.1
+HIGHER_IS_BETTER = frozenset({"updates_per_s", "ordered"})
+# the starved case (the bug this guards against) is 25x slower, so timer noise needs no tight bound
+TOLERANCES = {"other_user_ms": 0.5}
+
+
+def _update(update_id: int, uid: int, round_: int) -> Update:
+    user = User(id=uid, first_name="u", is_bot=False)
+    message = Message(message_id=round_, date=None, chat=Chat(id=uid, type="private"), from_user=user, text=str(round_))
+    return Update(update_id=update_id, message=message)
+
+
+def _updates() -> list[Update]:
+    updates = []
+    update_id = 0
+    for round_ in range(UPDATES_PER_USER):
+        for uid in range(1, USERS + 1):
+            update_id += 1
+            updates.append(_update(update_id, uid, round_))
+    return updates
+
+
+async def _run(processor, updates: list[Update]) -> tuple[float, bool]:
+    finished: dict[int, list[int]] = {}
+
+    async def handle(update: Update) -> None:
+        await asyncio.sleep(HANDLER_LATENCY)
+        finished.setdefault(update.effective_user.id, []).append(update.update_id)
+
+    await processor.initialize()
+    started = time.perf_counter()
+    if processor.max_concurrent_updates > 1:
+        await asyncio.gather(*(asyncio.create_task(processor.process_update(u, handle(u))) for u in updates))
+    else:
+        for u in updates:
+            await processor.process_update(u, handle(u))
+    elapsed = time.perf_counter() - started
+    await processor.shutdown()
+    ordered = all(ids == sorted(ids) for ids in finished.values())
+    return elapsed, ordered
+
+
+async def _other_user_latency(processor) -> float:
+    """Seconds until user 2's single update is handled while user 1 has BACKLOG queued."""
+
+    async def handle(update: Update) -> None:
+        await asyncio.sleep(BACKLOG_LATENCY)
+
+    await processor.initialize()
+    backlog = [_update(i, 1, i) for i in range(BACKLOG)]
+    tasks = [asyncio.create_task(processor.process_update(u, handle(u))) for u in backlog]
+    await asyncio.sleep(0)
+    other = _update(BACKLOG, 2, 0)
+    started = time.perf_counter()
+    await processor.process_update(other, handle(other))
+    latency = time.perf_counter() - started
+    await asyncio.gather(*tasks)
+    await processor.shutdown()
+    return latency
+
+
+def run() -> dict[str, dict[str, float]]:
+    """Return updates/second (and per-user ordering) for each processor."""
+    updates = _updates()
+    results = {}
+    for name, processor in (
+        ("sequential", SimpleUpdateProcessor(1)),
+        ("per-user x16", PerUserUpdateProcessor(16)),
+        ("per-user x64", PerUserUpdateProcessor(64)),
+    ):
+        elapsed, ordered = asyncio.run(_run(processor, updates))
+        results[name] = {"updates_per_s": len(updates) / elapsed, "ordered": float(ordered)}
+    latency = asyncio.run(_other_user_latency(PerUserUpdateProcessor(16)))
+    results["backlog x16"] = {"other_user_ms": latency * 1000}
+    return results
+
+
+def main() -> None:
+    print(f"{USERS} users x {UPDATES_PER_USER} updates, {HANDLER_LATENCY * 1000:.0f} ms per handler")
+    results = run()
+    backlog = results.pop("backlog x16")
+    for name, result in results.items():
+        ordered = "yes" if result["ordered"] else "NO"
+        print(f"{name:<14} {result['updates_per_s']:10.1f} updates/s   per-user order kept: {ordered}")
+    print(
+        f"backlog x16    other user's update took {backlog['other_user_ms']:.0f} ms "
+        f"behind {BACKLOG} x {BACKLOG_LATENCY * 1000:.0f} ms updates from one user"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""users.py on synthetic histories of SIZES interaction rows.
+
+For each size a users.csv with ROWS_PER_USER interactions per user is generated
+in a scratch directory and imported into a fresh users.db. Then it times:
+reading the distinct user ids straight from the database, building the
+in-memory UserIndex, reading ids from the index, one write-through
+save_user_record, and the per-record cost of a writer-sized batch. Reads and
+writes are timed REPEATS times and the best is kept; the import runs once.
+
+Run from the repository root: python benchmarks/bench_users.py [--sizes 10000 100000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import users  # noqa: E402
+
+SIZES = (10_000, 100_000, 1_000_000)
+ROWS_PER_USER = 4
+SAVES = 500
+BATCH = 200  # InteractionWriter's default batch_size
+REPEATS = 3
+# the one-shot import and the few-millisecond index builds and reads vary most between runs
+TOLERANCES = {"import_ms": 0.4, "index_load_ms": 0.5, "load_user_ids_index_ms": 0.5}
+INTENTS = ("consultation", "free_material", "exam_prep", "interest", "other")
+
+
+def _write_history(path: Path, rows: int) -> None:
+    rng = random.Random(rows)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    user_count = max(1, rows // ROWS_PER_USER)
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["user_id", "username", "intent", "timestamp"])
+        for i in range(rows):
+            uid = 10_000_000 + rng.randrange(user_count)
+            ts = start + timedelta(seconds=i * 30)
+            writer.writerow([uid, f"user{uid}", rng.choice(INTENTS), ts.isoformat()])
+
+
+def _open_store(directory: Path, rows: int) -> float:
+    """Point users.py at a fresh database seeded from a synthetic users.csv; returns the import time."""
+    if users._conn is not None:
+        users._conn.close()
+        users._conn = None
+    users.USERS_CSV = directory / f"users-{rows}.csv"
+    users.USERS_DB = directory / f"users-{rows}.db"
+    users.user_index = users.UserIndex()
+    _write_history(users.USERS_CSV, rows)
+    started = time.perf_counter()
+    users._connect()
+    return time.perf_counter() - started
+
+
+def _timed(func, repeat: int = 1, rounds: int = REPEATS) -> float:
+    """Best of `rounds` mean per-call times over `repeat` calls."""
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best
+
+
+def _load_index() -> None:
+    users.user_index = users.UserIndex()
+    users.user_index.load()
+
+
+def run(sizes: tuple[int, ...] = SIZES) -> dict[str, dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            import_s = _open_store(Path(tmp), rows)
+            # database path: the index is not loaded yet
+            ids_db = _timed(users.load_user_ids)
+            index_load = _timed(_load_index)
+            ids_index = _timed(users.load_user_ids, repeat=10)
+            uid = iter(range(1, SAVES * REPEATS + 1))
+            save = _timed(lambda: users.save_user_record(next(uid), "bench", "consultation"), repeat=SAVES)
+            batch = [users._make_record(20_000_000 + i, None, "free_material") for i in range(BATCH)]
+            batch_s = _timed(lambda: users._save_records(batch))
+            results[f"{rows} rows"] = {
+                "import_ms": import_s * 1e3,
+                "load_user_ids_db_ms": ids_db * 1e3,
+                "index_load_ms": index_load * 1e3,
+                "load_user_ids_index_ms": ids_index * 1e3,
+                "save_user_record_us": save * 1e6,
+                "batch_us_per_record": batch_s / BATCH * 1e6,
+            }
+        users._conn.close()
+        users._conn = None
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    args = parser.parse_args()
+    for name, result in run(tuple(args.sizes)).items():
+        print(name)
+        for metric, value in result.items():
+            print(f"  {metric:<24} {value:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
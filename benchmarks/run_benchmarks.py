@@ -0,0 +1,161 @@
+"""Run the hot-path benchmarks and compare them with saved JSON baselines.
+
+    python benchmarks/run_benchmarks.py                 # all suites, compare with baselines
+    python benchmarks/run_benchmarks.py chooser users   # selected suites
+    python benchmarks/run_benchmarks.py --save          # record new baselines
+
+Each suite is a bench_<name>.py module whose run() returns
+{case: {metric: value}}, each value the best of several repeats. Metrics are
+lower-is-better unless the module lists them in HIGHER_IS_BETTER. A metric
+that is worse than its baseline by more than its tolerance is reported as a
+regression, and the exit status is 1. A module's TOLERANCES maps metric names
+to their own allowed change (sub-microsecond timings need more room than
+millisecond ones); other metrics use --tolerance.
+
+Machine speed drifts between runs (frequency scaling, noisy neighbours), so a
+baseline is the median of SAVE_RUNS runs of the suite, and a suite that shows a
+regression is run up to CONFIRM_RUNS more times; only a metric that stays worse
+in its best run is reported.
+
+Baselines live in benchmarks/baselines/<suite>.json. They are only comparable
+on the machine that recorded them, so record them again (--save) before
+comparing on different hardware. bench_e2e.py is a load test, not a
+micro-benchmark, and is run on its own.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_DIR = BENCH_DIR / "baselines"
+SUITES = ("chooser", "ttlcache", "users", "handlers", "updates")
+TOLERANCE = 0.25
+SAVE_RUNS = 3
+CONFIRM_RUNS = 2
+
+
+# each suite runs in a fresh interpreter: suites repoint module-level state
+# (e.g. users.USERS_DB) and must not see each other's imports or caches
+_SUITE_RUNNER = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+module = __import__("bench_" + sys.argv[2])
+record = {
+    "results": module.run(),
+    "higher_is_better": sorted(getattr(module, "HIGHER_IS_BETTER", ())),
+    "tolerances": getattr(module, "TOLERANCES", {}),
+}
+with open(sys.argv[3], "w", encoding="utf-8") as f:
+    json.dump(record, f)
+"""
+
+
+def _run_suite(name: str) -> tuple[dict[str, dict[str, float]], frozenset[str], dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "result.json"
+        subprocess.run(
+            [sys.executable, "-c", _SUITE_RUNNER, str(BENCH_DIR), name, str(out)],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        record = json.loads(out.read_text(encoding="utf-8"))
+    return record["results"], frozenset(record["higher_is_better"]), record["tolerances"]
+
+
+def _combine(runs: list[dict], pick) -> dict[str, dict[str, float]]:
+    """Reduce several runs of one suite to one value per (case, metric) with `pick(metric, values)`."""
+    return {
+        case: {metric: pick(metric, [run[case][metric] for run in runs]) for metric in metrics}
+        for case, metrics in runs[0].items()
+    }
+
+
+def _median(metric: str, values: list[float]) -> float:
+    return statistics.median(values)
+
+
+def _compare(
+    results: dict, baseline: dict, higher_is_better: frozenset[str], tolerance: float, tolerances: dict[str, float]
+) -> list[str]:
+    """Return one line per metric whose change exceeds its tolerance, worse ones marked REGRESSION."""
+    lines = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(case, {}).get(metric)
+            if not before:
+                continue
+            change = (value - before) / before
+            allowed = tolerances.get(metric, tolerance)
+            if metric in higher_is_better:
+                worse, better = change < -allowed, change > allowed
+            else:
+                worse, better = change > allowed, change < -allowed
+            if worse or better:
+                label = "REGRESSION" if worse else "improved"
+                lines.append(f"  {label:<10} {case} / {metric}: {before:.4g} -> {value:.4g} ({change:+.0%})")
+    return lines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run benchmarks and compare with JSON baselines")
+    parser.add_argument("suites", nargs="*", help=f"any of {', '.join(SUITES)} (default: all)")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baselines")
+    parser.add_argument(
+        "--tolerance", type=float, default=TOLERANCE, help="allowed relative change for metrics without their own"
+    )
+    args = parser.parse_args()
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+
+    regressions = 0
+    for name in args.suites or SUITES:
+        started = time.perf_counter()
+        results, higher_is_better, tolerances = _run_suite(name)
+        path = BASELINE_DIR / f"{name}.json"
+        if args.save:
+            runs = [results] + [_run_suite(name)[0] for _ in range(SAVE_RUNS - 1)]
+            results = _combine(runs, _median)
+            print(f"{name}: {time.perf_counter() - started:.1f}s ({SAVE_RUNS} runs)")
+            BASELINE_DIR.mkdir(exist_ok=True)
+            record = {
+                "python": platform.python_version(),
+                "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+                "recorded": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "results": results,
+            }
+            path.write_text(json.dumps(record, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+            print(f"  saved {path.relative_to(BENCH_DIR.parent)}")
+            continue
+        if not path.exists():
+            print(f"{name}: {time.perf_counter() - started:.1f}s")
+            print("  no baseline; run with --save to record one")
+            continue
+        baseline = json.loads(path.read_text(encoding="utf-8"))["results"]
+
+        def best(metric: str, values: list[float]) -> float:
+            return max(values) if metric in higher_is_better else min(values)
+
+        runs = [results]
+        lines = _compare(results, baseline, higher_is_better, args.tolerance, tolerances)
+        while len(runs) <= CONFIRM_RUNS and any(line.lstrip().startswith("REGRESSION") for line in lines):
+            runs.append(_run_suite(name)[0])
+            lines = _compare(_combine(runs, best), baseline, higher_is_better, args.tolerance, tolerances)
+        print(f"{name}: {time.perf_counter() - started:.1f}s ({len(runs)} run{'s' if len(runs) > 1 else ''})")
+        regressions += sum(line.lstrip().startswith("REGRESSION") for line in lines)
+        print("\n".join(lines) if lines else "  within tolerance of baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""Concurrent, rate-limited broadcasts to recorded users.
+
+Messages are sent through the Application's Bot, so every request shares its
+pooled HTTP client. A token bucket keeps the global send rate under Telegram's
+limit (~30 msg/s) while a fixed pool of workers bounds the requests in flight.
+When an outbound dispatcher is installed, sends are queued at broadcast priority
+so interactive replies overtake them, and the dispatcher's global bucket does
+the pacing instead; RetryAfters it absorbs are still counted in `throttled`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+import outbound
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = 30.0  # messages per second, Telegram's documented bulk limit
+CONCURRENCY = 16
+MAX_RETRIES = 3
+BROADCASTS_DIR = Path(__file__).parent / "broadcasts"
+
+
+def campaign_id(prefix: str, *parts: str) -> str:
+    """Derive a stable broadcast id from the message content, e.g. `startup-3f2a9c1b0d`."""
+    digest = hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()
+    return f"{prefix}-{digest[:10]}"
+
+
+class BroadcastCheckpoint:
+    """Append-only progress log for one broadcast campaign.
+
+    `<id>.log` holds one settled chat id per line (delivered, blocked or rejected);
+    `<id>.done` marks a campaign that reached every recipient.
+    """
+
+    def __init__(self, broadcast_id: str, directory: Path = BROADCASTS_DIR):
+        self.broadcast_id = broadcast_id
+        self.log_path = directory / f"{broadcast_id}.log"
+        self.done_path = directory / f"{broadcast_id}.done"
+        self._fh = None
+
+    def is_complete(self) -> bool:
+        return self.done_path.exists()
+
+    def settled(self) -> set[int]:
+        if not self.log_path.exists():
+            return set()
+        ids: set[int] = set()
+        with self.log_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ids.add(int(line))
+                except ValueError:
+                    # a torn last line from a killed process
+                    continue
+        return ids
+
+    def record(self, chat_id: int) -> None:
+        if self._fh is None:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = self.log_path.open("a", encoding="utf-8")
+        self._fh.write(f"{chat_id}\n")
+        # flush per line so a killed process loses at most the in-flight sends
+        self._fh.flush()
+
+    def mark_complete(self) -> None:
+        self.done_path.parent.mkdir(parents=True, exist_ok=True)
+        self.done_path.touch()
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class Broadcaster:
+    """Send one message to many chats with bounded concurrency and rate limiting."""
+
+    def __init__(self, bot, rate: float = GLOBAL_RATE, concurrency: int = CONCURRENCY, max_retries: int = MAX_RETRIES):
+        self.bot = bot
+        # paces sends only when no outbound dispatcher is installed; otherwise its global bucket does
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    async def _send_one(self, chat_id: int, text: str, reply_markup, stats: dict) -> str:
+        """Deliver to one chat, retrying transient errors. Returns the final outcome key."""
+
+        def throttled() -> None:
+            stats["throttled"] += 1
+
+        dispatcher = outbound.get_dispatcher()
+        bucket = self.bucket if dispatcher is None else dispatcher.global_bucket
+        for _ in range(self.max_retries + 1):
+            if dispatcher is None:
+                await bucket.acquire()
+            try:
+                await outbound.request(
+                    chat_id,
+                    lambda: self.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup),
+                    priority=outbound.BROADCAST,
+                    on_throttle=throttled,
+                )
+                return "sent"
+            except RetryAfter as e:
+                # flood control applies to the whole bot, so pause every sender
+                throttled()
+                bucket.pause(float(e.retry_after))
+            except Forbidden:
+                # user blocked the bot or deleted their account
+                return "blocked"
+            except BadRequest as e:
+                logger.debug("Broadcast to %s rejected: %s", chat_id, e)
+                return "rejected"
+            except NetworkError as e:
+                logger.debug("Broadcast to %s hit a network error: %s", chat_id, e)
+            except Exception as e:
+                logger.debug("Broadcast to %s failed: %s", chat_id, e)
+                return "failed"
+        return "failed"
+
+    async def send(
+        self, chat_ids: Iterable[int], text: str, reply_markup=None, checkpoint: Optional[BroadcastCheckpoint] = None
+    ) -> dict:
+        """Send `text` to every chat in `chat_ids`. Returns a stats dict.
+
+        With a `checkpoint`, chats already settled by an earlier run are skipped and
+        a campaign that finished before is not sent again.
+        """
+        stats = {"sent": 0, "failed": 0, "blocked": 0, "rejected": 0, "throttled": 0, "skipped": 0}
+        if checkpoint is not None and checkpoint.is_complete():
+            logger.info("Broadcast %s already completed; not sending again", checkpoint.broadcast_id)
+            return stats
+        done = checkpoint.settled() if checkpoint is not None else set()
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            if chat_id in done:
+                stats["skipped"] += 1
+                continue
+            queue.put_nowait(chat_id)
+
+        async def worker() -> None:
+            while True:
+                try:
+                    chat_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                outcome = await self._send_one(chat_id, text, reply_markup, stats)
+                stats[outcome] += 1
+                # only transient failures are left for a later run to retry
+                if checkpoint is not None and outcome != "failed":
+                    checkpoint.record(chat_id)
+
+        started = time.monotonic()
+        total = queue.qsize() + stats["skipped"]
+        workers = min(self.concurrency, queue.qsize())
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        # blocked and rejected chats are settled for good; only transient failures keep it open
+        if checkpoint is not None and total and stats["failed"] == 0:
+            checkpoint.mark_complete()
+        logger.info(
+            "Broadcast finished in %.1fs: sent=%d failed=%d blocked=%d rejected=%d throttled=%d skipped=%d",
+            time.monotonic() - started,
+            stats["sent"], stats["failed"], stats["blocked"], stats["rejected"], stats["throttled"], stats["skipped"],
+        )
+        return stats
+
+
+async def broadcast(
+    bot, chat_ids: Iterable[int], text: str, reply_markup=None, broadcast_id: Optional[str] = None, **kwargs
+) -> dict:
+    """Convenience wrapper around `Broadcaster(bot, **kwargs).send(...)`.
+
+    Passing a `broadcast_id` makes the run resumable via a `BroadcastCheckpoint`.
+    """
+    checkpoint = BroadcastCheckpoint(broadcast_id) if broadcast_id else None
+    return await Broadcaster(bot, **kwargs).send(chat_ids, text, reply_markup, checkpoint=checkpoint)
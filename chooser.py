@@ -1,38 +1,186 @@
-from __future__ import annotations
-
 """Simple chooser helpers.
 
 Provides parse_intent(text) -> str and to_choice_number(intent_label) -> int.
+
+The synonym table is normalized once at import. A message is folded the same way
+(NFKC width folding, case folding, punctuation and whitespace folding) and looked
+up in a dict; only when that misses is a bounded edit-distance match tried against
+synonyms of similar length. Results for short texts are kept in a bounded LRU.
 """
 
-from typing import Final
+from __future__ import annotations
 
+import functools
+import re
+import unicodedata
+from typing import Final
 
-def parse_intent(text: str) -> str:
-    normalized = text.strip().lower()
-    if normalized in (
+SYNONYMS: Final = {
+    "consultation": (
         "1",
         "咨询",
+        "辅导咨询",
+        "我要咨询",
+        "咨詢",
+        "諮詢",
         "consult",
         "consultation",
+        "tutoring",
         "tutoring consultation",
         "tutoringconsultation",
-    ):
-        return "consultation"
-    if normalized in (
+    ),
+    "free_material": (
         "2",
         "免费",
+        "免费资料",
+        "学习资料",
+        "资料",
+        "免費",
+        "免費資料",
+        "學習資料",
+        "資料",
         "free",
         "free material",
         "free materials",
         "free chinese materials",
-    ):
-        return "free_material"
-    if normalized == "备考":
-        return "exam_prep"
-    if normalized == "自己兴趣":
-        return "interest"
-    return text
+        "materials",
+    ),
+    "exam_prep": ("备考", "備考", "exam", "exam prep", "exam preparation"),
+    "interest": ("自己兴趣", "自己興趣", "兴趣", "興趣", "interest"),
+}
+
+# longer inputs are never fuzzy-matched; they are sentences, not button labels
+MAX_FUZZY_LEN: Final = 32
+INTENT_CACHE_SIZE: Final = 4096
+# free-form messages longer than this are classified without caching
+MAX_CACHED_LEN: Final = 64
+
+_NON_WORD: Final = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Fold width, case, punctuation and whitespace: '  Free-Materials！' -> 'free materials'."""
+    folded = unicodedata.normalize("NFKC", text).casefold()
+    return _NON_WORD.sub(" ", folded).strip()
+
+
+def _max_distance(length: int) -> int:
+    # short words sit one edit away from unrelated words ("tree", "fred" vs "free"),
+    # and two edits turn "internet" into "interest"; stay strict below 12 characters
+    if length < 5:
+        return 0
+    if length < 12:
+        return 1
+    return 2
+
+
+def _bigrams(word: str) -> frozenset[str]:
+    return frozenset(word[i : i + 2] for i in range(len(word) - 1))
+
+
+class _Candidate:
+    """A synonym prepared for fuzzy matching: bigram set plus bit masks for Myers' algorithm."""
+
+    __slots__ = ("word", "intent", "limit", "bigrams", "masks", "full", "high")
+
+    def __init__(self, word: str, intent: str):
+        self.word = word
+        self.intent = intent
+        self.limit = _max_distance(len(word))
+        self.bigrams = _bigrams(word)
+        masks: dict[str, int] = {}
+        for i, ch in enumerate(word):
+            masks[ch] = masks.get(ch, 0) | (1 << i)
+        self.masks = masks
+        self.full = (1 << len(word)) - 1
+        self.high = 1 << (len(word) - 1)
+
+    def distance(self, text: str, limit: int) -> int:
+        """Levenshtein distance to text (bit-parallel, Hyyrö 2001), or limit + 1 once it must exceed limit."""
+        full, high, get = self.full, self.high, self.masks.get
+        pv, mv, score = full, 0, len(self.word)
+        remaining = len(text)
+        for ch in text:
+            eq = get(ch, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & full)
+            mh = pv & xh
+            if ph & high:
+                score += 1
+            elif mh & high:
+                score -= 1
+            remaining -= 1
+            if score - remaining > limit:
+                return limit + 1
+            ph = ((ph << 1) | 1) & full
+            mh = (mh << 1) & full
+            pv = mh | (~(xv | ph) & full)
+            mv = ph & xv
+        return score
+
+
+def _build_table() -> tuple[dict[str, str], dict[int, list[_Candidate]]]:
+    exact: dict[str, str] = {}
+    by_length: dict[int, list[_Candidate]] = {}
+    for intent, words in SYNONYMS.items():
+        for word in words:
+            key = normalize(word)
+            for variant in {key, key.replace(" ", "")}:
+                exact[variant] = intent
+                if _max_distance(len(variant)):
+                    by_length.setdefault(len(variant), []).append(_Candidate(variant, intent))
+    return exact, by_length
+
+
+_EXACT, _BY_LENGTH = _build_table()
+
+
+def _fuzzy_match(key: str) -> str | None:
+    limit = _max_distance(len(key))
+    if not limit or len(key) > MAX_FUZZY_LEN:
+        return None
+    grams = _bigrams(key)
+    best_intent, best_distance = None, limit + 1
+    for length in range(len(key) - limit, len(key) + limit + 1):
+        for candidate in _BY_LENGTH.get(length, ()):
+            # each edit destroys at most two bigrams, so a close match must share the rest
+            if len(grams & candidate.bigrams) < max(len(grams), len(candidate.bigrams)) - 2 * limit:
+                continue
+            # the shorter of the two words decides how many edits are allowed
+            allowed = min(limit, candidate.limit)
+            distance = candidate.distance(key, min(allowed, best_distance))
+            if distance > allowed:
+                continue
+            if distance < best_distance:
+                best_intent, best_distance = candidate.intent, distance
+            elif distance == best_distance and candidate.intent != best_intent:
+                # equally close to two different intents: too ambiguous to guess
+                best_intent = None
+    return best_intent if best_distance <= limit else None
+
+
+def _classify(text: str) -> str:
+    key = normalize(text)
+    intent = _EXACT.get(key) or _EXACT.get(key.replace(" ", ""))
+    if intent is None:
+        intent = _fuzzy_match(key)
+    return intent if intent is not None else text
+
+
+# Most messages are the exact reply-keyboard labels, so results are memoized on the raw text.
+_cached_classify = functools.lru_cache(maxsize=INTENT_CACHE_SIZE)(_classify)
+
+
+def parse_intent(text: str) -> str:
+    if len(text) > MAX_CACHED_LEN:
+        return _classify(text)
+    return _cached_classify(text)
+
+
+def intent_cache_info() -> functools._CacheInfo:
+    """Hits, misses and current size of the parse_intent cache."""
+    return _cached_classify.cache_info()
 
 
 def to_choice_number(intent_label: str) -> int:
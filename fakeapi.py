@@ -0,0 +1,419 @@
+"""In-process stand-in for the Telegram Bot API, for offline end-to-end and load tests.
+
+Implements the methods the bot uses: getMe, getUpdates (long polling),
+setWebhook/deleteWebhook/getWebhookInfo, sendMessage, sendDocument and
+sendMediaGroup. Other methods get Telegram's 404. Send methods can be slowed
+down and can fail on purpose: `latency` + up to `jitter` seconds per call, and a
+`rate_limit` share of 429 RetryAfter replies, an `error_rate` share of 502s and a
+`blocked_rate` share of 403s.
+
+Incoming traffic is simulated with `push_update()`/`push_text()`. The updates are
+served to getUpdates or, after setWebhook, POSTed to the webhook URL. Every
+message the bot sends is appended to that chat's `outbox()` queue.
+
+Point the bot at it with TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot. When it
+runs standalone, updates can be pushed over HTTP:
+
+    python fakeapi.py --port 8081 --latency 0.05 --rate-limit 0.01
+    curl -d '{"user_id": 1, "text": "/start"}' http://127.0.0.1:8081/fake/text
+    curl http://127.0.0.1:8081/fake/stats
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import HTTP
+from typing import Any, Optional
+from urllib.parse import parse_qsl
+
+from telegram.request import BaseRequest
+
+from httpserver import Request, Response, serve, text_response
+
+logger = logging.getLogger(__name__)
+
+SEND_METHODS = frozenset({"sendMessage", "sendDocument", "sendMediaGroup"})
+MAX_UPLOAD = 50 << 20  # the Bot API's upload limit for documents
+# load tests open a pool per simulated client on top of the bot's own
+MAX_CONNECTIONS = 4096
+WEBHOOK_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def _json_response(status: int, payload: dict) -> Response:
+    return status, {"Content-Type": "application/json"}, json.dumps(payload).encode("utf-8")
+
+
+def _ok(result: Any) -> Response:
+    return _json_response(200, {"ok": True, "result": result})
+
+
+def _error(status: int, description: str, **parameters: Any) -> Response:
+    payload: dict = {"ok": False, "error_code": status, "description": description}
+    if parameters:
+        payload["parameters"] = parameters
+    return _json_response(status, payload)
+
+
+def _parse_params(request: Request) -> dict[str, Any]:
+    """Decode a Bot API call: query string plus a form, multipart or JSON body.
+
+    Uploaded files are replaced by {"filename": ..., "size": ...}.
+    """
+    params: dict[str, Any] = {k: v[-1] for k, v in request.query.items()}
+    content_type = request.headers.get("content-type", "")
+    if not request.body:
+        return params
+    if content_type.startswith("application/json"):
+        params.update(json.loads(request.body))
+    elif content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + request.body
+        )
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            filename = part.get_filename()
+            params[name] = {"filename": filename, "size": len(payload)} if filename else payload.decode("utf-8")
+    else:
+        params.update(parse_qsl(request.body.decode("utf-8"), keep_blank_values=True))
+    return params
+
+
+def _json_param(value: Any) -> Any:
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def text_update(user_id: int, text: str, username: Optional[str] = None, message_id: int = 1) -> dict:
+    """Update dict (without update_id) for a private text message; commands get their bot_command entity."""
+    user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+    if username:
+        user["username"] = username
+    message: dict = {
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": user,
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"message": message}
+
+
+class FakeBotAPI:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit: float = 0.0,
+        retry_after: int = 1,
+        error_rate: float = 0.0,
+        blocked_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.blocked_rate = blocked_rate
+        self.random = random.Random(seed)
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.stats: Counter = Counter()
+        self._updates: list[dict] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._new_updates = asyncio.Condition()
+        self._outboxes: dict[int, asyncio.Queue] = {}
+        self._webhook_tasks: set[asyncio.Task] = set()
+        self._http = None
+        self._server: Optional[asyncio.Server] = None
+        self._closing = False
+
+    # -- lifecycle --
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL to give the bot (".../bot")."""
+        self._server = await serve(self.handle, host, port, max_body=MAX_UPLOAD, max_connections=MAX_CONNECTIONS)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/bot"
+
+    async def stop(self) -> None:
+        # answer pending long polls now instead of leaving them to be cancelled
+        self._closing = True
+        async with self._new_updates:
+            self._new_updates.notify_all()
+        await asyncio.sleep(0)
+        if self._webhook_tasks:
+            await asyncio.gather(*self._webhook_tasks, return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    # -- simulated users --
+
+    def outbox(self, chat_id: int) -> asyncio.Queue:
+        """Messages the bot sent to `chat_id`, in order."""
+        queue = self._outboxes.get(chat_id)
+        if queue is None:
+            queue = self._outboxes[chat_id] = asyncio.Queue()
+        return queue
+
+    async def push_update(self, update: dict) -> int:
+        """Deliver `update` (an Update dict without update_id) to the bot; returns its update_id."""
+        update_id = update["update_id"] = next(self._update_ids)
+        self.stats["updates"] += 1
+        if self.webhook_url:
+            task = asyncio.create_task(self._post_webhook(update))
+            self._webhook_tasks.add(task)
+            task.add_done_callback(self._webhook_tasks.discard)
+        else:
+            async with self._new_updates:
+                self._updates.append(update)
+                self._new_updates.notify_all()
+        return update_id
+
+    async def push_text(self, user_id: int, text: str, username: Optional[str] = None) -> int:
+        """A private-chat text message from `user_id`."""
+        return await self.push_update(text_update(user_id, text, username, next(self._message_ids)))
+
+    async def _post_webhook(self, update: dict) -> None:
+        import httpx
+
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=10)
+        headers = {WEBHOOK_SECRET_HEADER: self.webhook_secret} if self.webhook_secret else {}
+        try:
+            response = await self._http.post(self.webhook_url, json=update, headers=headers)
+            self.stats[f"webhook_{response.status_code}"] += 1
+        except httpx.HTTPError as e:
+            self.stats["webhook_errors"] += 1
+            logger.warning("Webhook delivery of update %s failed: %s", update["update_id"], e)
+
+    # -- HTTP --
+
+    async def handle(self, request: Request) -> Response:
+        if request.path.startswith("/fake/"):
+            return await self._control(request)
+        _, _, rest = request.path.partition("/bot")
+        token, _, method = rest.partition("/")
+        if not token or not method:
+            return _error(404, "Not Found")
+        try:
+            params = _parse_params(request)
+        except (ValueError, UnicodeDecodeError):
+            return _error(400, "Bad Request: can't parse request parameters")
+        return await self.call(token, method, params)
+
+    async def call(self, token: str, method: str, params: dict[str, Any]) -> Response:
+        """Answer one Bot API call whose parameters are already decoded."""
+        self.stats[method] += 1
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        handler = getattr(self, f"_method_{method}", None)
+        if handler is None:
+            return _error(404, "Not Found: method not found")
+        if method in SEND_METHODS:
+            injected = self._inject_failure()
+            if injected is not None:
+                return injected
+        return handler(token, params)
+
+    def _inject_failure(self) -> Optional[Response]:
+        roll = self.random.random()
+        if roll < self.rate_limit:
+            self.stats["injected_429"] += 1
+            return _error(
+                429, f"Too Many Requests: retry after {self.retry_after}", retry_after=self.retry_after
+            )
+        roll -= self.rate_limit
+        if roll < self.error_rate:
+            self.stats["injected_502"] += 1
+            return _error(502, "Bad Gateway")
+        roll -= self.error_rate
+        if roll < self.blocked_rate:
+            self.stats["injected_403"] += 1
+            return _error(403, "Forbidden: bot was blocked by the user")
+        return None
+
+    async def _get_updates(self, params: dict) -> Response:
+        if self.webhook_url:
+            return _error(409, "Conflict: can't use getUpdates method while webhook is active")
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        async with self._new_updates:
+            # confirmed updates are never served again
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if not self._updates and timeout > 0 and not self._closing:
+                try:
+                    await asyncio.wait_for(
+                        self._new_updates.wait_for(lambda: self._updates or self._closing), timeout
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            return _ok(self._updates[:limit])
+
+    async def _control(self, request: Request) -> Response:
+        if request.path == "/fake/stats":
+            return _json_response(200, dict(self.stats))
+        if request.method != "POST":
+            return text_response(405)
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return text_response(400)
+        if request.path == "/fake/updates":
+            ids = [await self.push_update(u) for u in (payload if isinstance(payload, list) else [payload])]
+            return _json_response(200, {"update_ids": ids})
+        if request.path == "/fake/text":
+            update_id = await self.push_text(int(payload["user_id"]), payload["text"], payload.get("username"))
+            return _json_response(200, {"update_ids": [update_id]})
+        return text_response(404)
+
+    # -- Bot API methods --
+
+    def _method_getMe(self, token: str, params: dict) -> Response:
+        bot_id = int(token.partition(":")[0]) if token.partition(":")[0].isdigit() else 1
+        return _ok({"id": bot_id, "is_bot": True, "first_name": "Fake Bot", "username": "fake_bot"})
+
+    def _method_setWebhook(self, token: str, params: dict) -> Response:
+        self.webhook_url = params.get("url") or None
+        self.webhook_secret = params.get("secret_token") or None
+        return _ok(True)
+
+    def _method_deleteWebhook(self, token: str, params: dict) -> Response:
+        self.webhook_url = self.webhook_secret = None
+        if params.get("drop_pending_updates") in ("true", True):
+            self._updates.clear()
+        return _ok(True)
+
+    def _method_getWebhookInfo(self, token: str, params: dict) -> Response:
+        return _ok({"url": self.webhook_url or "", "has_custom_certificate": False, "pending_update_count": 0})
+
+    def _message(self, params: dict, **content: Any) -> dict:
+        chat_id = int(params["chat_id"])
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            **content,
+        }
+        self.outbox(chat_id).put_nowait(message)
+        return message
+
+    def _document(self, value: Any) -> dict:
+        file_id = value if isinstance(value, str) and not value.startswith("attach://") else None
+        n = next(self._file_ids)
+        document = {"file_id": file_id or f"fake-file-{n}", "file_unique_id": f"fake-unique-{n}"}
+        if isinstance(value, dict):
+            document.update(file_name=value["filename"], file_size=value["size"])
+        return document
+
+    def _method_sendMessage(self, token: str, params: dict) -> Response:
+        if "chat_id" not in params or not params.get("text"):
+            return _error(400, "Bad Request: message text is empty")
+        return _ok(self._message(params, text=params["text"]))
+
+    def _method_sendDocument(self, token: str, params: dict) -> Response:
+        if "chat_id" not in params or "document" not in params:
+            return _error(400, "Bad Request: there is no document in the request")
+        content: dict = {"document": self._document(params["document"])}
+        if params.get("caption"):
+            content["caption"] = params["caption"]
+        return _ok(self._message(params, **content))
+
+    def _method_sendMediaGroup(self, token: str, params: dict) -> Response:
+        media = _json_param(params.get("media") or "[]")
+        if "chat_id" not in params or not 2 <= len(media) <= 10:
+            return _error(400, "Bad Request: wrong number of media in the group")
+        messages = []
+        group_id = str(next(self._file_ids))
+        for item in media:
+            source = item["media"]
+            if source.startswith("attach://"):
+                source = params.get(source[len("attach://"):], source)
+            messages.append(self._message(params, media_group_id=group_id, document=self._document(source)))
+        return _ok(messages)
+
+
+class InProcessRequest(BaseRequest):
+    """Bot request backend that answers from a FakeBotAPI directly, without sockets.
+
+    Use it as `ApplicationBuilder().request(...)` to run handlers against the fake
+    API at function-call cost, e.g. in benchmarks.
+    """
+
+    def __init__(self, api: FakeBotAPI):
+        self.api = api
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs) -> tuple[int, bytes]:
+        _, _, rest = url.partition("/bot")
+        token, _, api_method = rest.partition("/")
+        params: dict[str, Any] = dict(request_data.json_parameters) if request_data else {}
+        if request_data is not None and request_data.contains_files:
+            for name, (filename, content, *_) in request_data.multipart_data.items():
+                params[name] = {"filename": filename, "size": len(content)}
+        status, _, body = await self.api.call(token, api_method, params)
+        return status, body
+
+
+async def _serve_forever(api: FakeBotAPI, host: str, port: int) -> None:
+    base_url = await api.start(host, port)
+    logger.info("Fake Bot API listening; use TELEGRAM_API_BASE_URL=%s", base_url)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local fake Telegram Bot API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds, uniformly")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of sends answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of sends answered with 502")
+    parser.add_argument("--blocked-rate", type=float, default=0.0, help="share of sends answered with 403")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    fake = FakeBotAPI(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+        blocked_rate=args.blocked_rate,
+        seed=args.seed,
+    )
+    try:
+        asyncio.run(_serve_forever(fake, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
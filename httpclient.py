@@ -0,0 +1,115 @@
+"""One pooled, keep-alive HTTP client for every outgoing request in the process.
+
+The Application's Bot API requests (sends, uploads and getUpdates), broadcasts,
+which go through the Bot, and admin scripts such as `webhook.py replay` all
+use the client from `get_client()`. Connections, TLS sessions and DNS results
+are reused instead of being set up per request or per component.
+
+HTTP/2 is used when the optional `h2` package is installed
+(pip install "httpx[http2]"), unless HTTP2=0. HTTP2=1 without h2 logs a warning
+and falls back to HTTP/1.1. Pool limits come from the environment:
+
+    HTTP_POOL_SIZE         256   connections in total
+    HTTP_KEEPALIVE         64    idle connections kept open
+    HTTP_KEEPALIVE_EXPIRY  60    seconds an idle connection is kept
+    HTTP_POOL_TIMEOUT      5     seconds to wait for a free connection
+    HTTP2                  auto  "auto", "1" or "0"
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import logging
+import os
+import time
+from typing import Optional
+
+import httpx
+from telegram.request import HTTPXRequest
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE") or 256)
+KEEPALIVE = int(os.getenv("HTTP_KEEPALIVE") or 64)
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY") or 60.0)
+POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT") or 5.0)
+HTTP2 = os.getenv("HTTP2", "auto")
+# PTB's defaults; the Updater passes its own, longer read timeout for getUpdates
+TIMEOUT = httpx.Timeout(connect=5.0, read=5.0, write=5.0, pool=POOL_TIMEOUT)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+_http2: Optional[bool] = None
+
+
+def http2_enabled() -> bool:
+    global _http2
+    if _http2 is None:
+        wanted = HTTP2 not in ("", "0")
+        available = importlib.util.find_spec("h2") is not None
+        if wanted and not available and HTTP2 != "auto":
+            logger.warning(
+                'HTTP2=%s but the h2 package is not installed; using HTTP/1.1 (pip install "httpx[http2]")', HTTP2
+            )
+        _http2 = wanted and available
+    return _http2
+
+
+def get_client() -> httpx.AsyncClient:
+    """The process-wide client; a new one is opened if the last was closed."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=POOL_SIZE,
+                max_keepalive_connections=KEEPALIVE,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            http2=http2_enabled(),
+        )
+        logger.debug("Opened shared HTTP client (pool=%d, http2=%s)", POOL_SIZE, http2_enabled())
+    return _client
+
+
+async def aclose() -> None:
+    """Close the shared client; call once, after everything using it has stopped."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+class SharedClientRequest(HTTPXRequest):
+    """HTTPXRequest backed by the shared client.
+
+    `shutdown()` leaves the client open for the other users; `aclose()` closes it.
+    """
+
+    def __init__(self):
+        super().__init__(connection_pool_size=POOL_SIZE, http_version="2" if http2_enabled() else "1.1")
+
+    def _build_client(self) -> httpx.AsyncClient:
+        return get_client()
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class InstrumentedRequest(SharedClientRequest):
+    """Shared-client request that records every Bot API call's latency and status per method."""
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs):
+        api_method = url.rpartition("/")[2]
+        started = time.perf_counter()
+        status = "error"
+        try:
+            status_code, payload = await super().do_request(url, method, request_data, **kwargs)
+            status = str(status_code)
+            return status_code, payload
+        finally:
+            metrics.API_SECONDS.labels(api_method).observe(time.perf_counter() - started)
+            metrics.API_RESPONSES.labels(api_method, status).inc()
@@ -0,0 +1,143 @@
+"""Minimal asyncio HTTP/1.1 server for the bot's local endpoints.
+
+Only what the webhook receiver and local tooling need: Content-Length bodies,
+keep-alive, and one task per connection so requests are handled in parallel.
+Handlers are coroutines taking a `Request` and returning (status, headers, body).
+
+A connection that sends nothing for `idle_timeout` seconds, between requests or
+halfway through one, is closed. At most `max_connections` are served at once;
+further clients get a 503 and are disconnected.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import ssl
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Awaitable, Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY = 1 << 20  # Telegram updates are far below 1 MiB
+MAX_HEADER_LINES = 100
+IDLE_TIMEOUT = 30.0  # seconds to wait for the next request (or the rest of one)
+MAX_CONNECTIONS = 256
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: dict[str, list[str]]
+    headers: dict[str, str]
+    body: bytes = b""
+    peer: object = field(default=None, repr=False)
+
+
+Response = tuple[int, dict[str, str], bytes]
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+def text_response(status: int, text: str = "", content_type: str = "text/plain; charset=utf-8") -> Response:
+    return status, {"Content-Type": content_type}, text.encode("utf-8")
+
+
+async def _read_request(reader: asyncio.StreamReader, max_body: int) -> Optional[Request]:
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ValueError("malformed request line")
+    headers: dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise ValueError("too many headers")
+    length = int(headers.get("content-length") or 0)
+    if length > max_body:
+        raise OverflowError(length)
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    return Request(method.upper(), url.path, parse_qs(url.query), headers, body)
+
+
+def _encode_response(status: int, headers: dict[str, str], body: bytes, keep_alive: bool) -> bytes:
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ""
+    lines = [f"HTTP/1.1 {status} {reason}"]
+    headers = {**headers, "Content-Length": str(len(body)), "Connection": "keep-alive" if keep_alive else "close"}
+    lines.extend(f"{k}: {v}" for k, v in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def serve(
+    handler: Handler,
+    host: str,
+    port: int,
+    ssl_context: Optional[ssl.SSLContext] = None,
+    max_body: int = MAX_BODY,
+    idle_timeout: float = IDLE_TIMEOUT,
+    max_connections: int = MAX_CONNECTIONS,
+) -> asyncio.Server:
+    """Start serving `handler` on host:port and return the running asyncio.Server."""
+    open_connections = 0
+
+    async def on_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        nonlocal open_connections
+        peer = writer.get_extra_info("peername")
+        if open_connections >= max_connections:
+            logger.warning("Refusing connection from %s: %d connections open", peer, open_connections)
+            writer.write(_encode_response(503, {}, b"", keep_alive=False))
+            writer.close()
+            return
+        open_connections += 1
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader, max_body), idle_timeout)
+                except asyncio.TimeoutError:
+                    # idle keep-alive connection or a client trickling its request: drop it
+                    break
+                except OverflowError:
+                    writer.write(_encode_response(413, {}, b"", keep_alive=False))
+                    break
+                except (ValueError, asyncio.IncompleteReadError):
+                    writer.write(_encode_response(400, {}, b"", keep_alive=False))
+                    break
+                if request is None:
+                    break
+                request.peer = peer
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                try:
+                    status, headers, body = await handler(request)
+                except Exception:
+                    logger.exception("Unhandled error serving %s %s", request.method, request.path)
+                    status, headers, body = 500, {}, b""
+                writer.write(_encode_response(status, headers, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            open_connections -= 1
+            writer.close()
+
+    return await asyncio.start_server(on_connection, host, port, ssl=ssl_context)
+
+
+def make_ssl_context(certfile: str, keyfile: Optional[str] = None) -> ssl.SSLContext:
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile, keyfile)
+    return context
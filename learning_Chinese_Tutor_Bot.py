@@ -1,141 +1,265 @@
 from __future__ import annotations
 
+# first, so the startup report can time the imports below (BOT_STARTUP_REPORT=1)
+import startup
+
 import os
 import logging
-from typing import Final
+import time
+from typing import Final, Optional
 
-from telegram import ReplyKeyboardMarkup, Update, Bot
+from telegram import Update, Bot
+from telegram.request import BaseRequest
 import asyncio
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, ConversationHandler, MessageHandler, filters
+from telegram.ext import (
+    Application,
+    ApplicationBuilder,
+    CommandHandler,
+    ContextTypes,
+    ConversationHandler,
+    MessageHandler,
+    PersistenceInput,
+    TypeHandler,
+    filters,
+)
+
+import httpclient
+import metrics
+import outbound
+import templates
+from messaging import send_text, send_button, reply_text
+from chooser import SYNONYMS, parse_intent
+from materials import send_materials
+from users import InteractionWriter
+from users import load_user_ids, user_index
+from update_processor import PerUserUpdateProcessor
+from persistence import SQLitePersistence
 
-from messaging import send_text, send_button, ad_message_text
-from chooser import parse_intent
-from materials import send_materials_link
-from users import save_user_record
-from users import load_user_ids
+# broadcast and webhook are imported where they are used: neither is needed to
+# start serving updates
+startup.stop_import_timer()
+startup.mark("imports")
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 TOKEN: Final = os.getenv("TELEGRAM_BOT_TOKEN") or '8237551014:AAGjpKh0_UbXG7oHwE0LiU6YwhjfIAGPRk0'
 
 INTENT = 1
+# updates from different users are handled concurrently, up to this many at once
+CONCURRENT_UPDATES: Final = int(os.getenv("BOT_CONCURRENT_UPDATES", "64"))
+# "polling" (default) or "webhook"; webhook mode needs WEBHOOK_URL, the public URL Telegram posts to
+BOT_MODE: Final = os.getenv("BOT_MODE", "polling")
+# e.g. http://127.0.0.1:8081/bot to run against fakeapi.py instead of Telegram
+API_BASE_URL: Final = os.getenv("TELEGRAM_API_BASE_URL")
+# Prometheus text endpoint, off unless METRICS_PORT is set
+METRICS_PORT: Final = int(os.getenv("METRICS_PORT") or 0)
+METRICS_LISTEN: Final = os.getenv("METRICS_LISTEN", "127.0.0.1")
+# seconds queued sends get at shutdown; stop.sh sends SIGKILL after 5
+DRAIN_TIMEOUT: Final = float(os.getenv("BOT_DRAIN_TIMEOUT") or 3.0)
+# user ids allowed to run /stats, comma-separated
+ADMIN_IDS: Final = [int(uid) for uid in os.getenv("BOT_ADMIN_IDS", "").split(",") if uid.strip()]
+
+metrics.register_dispatcher(outbound.get_dispatcher)
 
 
 class BotApp:
-    def __init__(self, token: str):
+    def __init__(self, token: str, base_url: Optional[str] = API_BASE_URL, request: Optional[BaseRequest] = None):
         self.token = token
+        self.base_url = base_url
+        # replaces the default HTTPX request for Bot API calls (benchmarks use fakeapi.InProcessRequest)
+        self.request = request
+        # interaction records are written in batches off the event loop
+        self.writer = InteractionWriter(fsync=os.getenv("USERS_FSYNC", "normal"))
+        # every outbound message is queued here; handlers return once their replies are queued
+        self.dispatcher = outbound.OutboundDispatcher()
+        self.metrics_server = None
+        self._deferred_startup: Optional[asyncio.Task] = None
 
+    @metrics.timed_handler("start")
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-        keyboard = ReplyKeyboardMarkup(
-            [["Tutoring consultation", "Free Chinese materials"]], one_time_keyboard=True, resize_keyboard=True
-        )
-        await update.message.reply_text(
-            "Hello! I am Midas Chinese Tutor Bot.\nIf you want a tutoring consultation, tap 'Tutoring consultation'.\nIf you want free Chinese learning materials, tap 'Free Chinese materials'.\nIf you have any questions, feel free to contact me on Telegram or WhatsApp: 86549811.\nPlease choose an option by tapping a button or typing your choice:",
-            reply_markup=keyboard,
+        await send_text(
+            context.bot, update.effective_chat.id, templates.WELCOME_TEXT, reply_markup=templates.MAIN_KEYBOARD
         )
         return INTENT
 
+    @metrics.timed_handler("intent")
     async def intent_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        started = time.perf_counter()
         user = update.effective_user
         text = update.message.text.strip()
         intent = parse_intent(text)
-        save_user_record(user.id if user else 0, user.username if user else None, intent)
+        # free text is not a label value: it would create one series per message
+        label = intent if intent in SYNONYMS else "other"
+        metrics.INTENTS.labels(label).inc()
+        try:
+            return await self._handle_intent(update, context, user, intent)
+        finally:
+            metrics.INTENT_SECONDS.labels(label).observe(time.perf_counter() - started)
+
+    async def _handle_intent(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user, intent: str) -> int:
+        self.writer.enqueue(user.id if user else 0, user.username if user else None, intent)
 
         # Flow: consultation -> ad then materials; free_material -> materials then ad
         if intent in ("consultation", "exam_prep"):
             # send ad first
-            await send_text(context.bot, update.effective_chat.id, ad_message_text())
-            await send_materials_link(context.bot, update.effective_chat.id)
+            await send_text(context.bot, update.effective_chat.id, templates.AD_TEXT)
+            await send_materials(context.bot, update.effective_chat.id)
         elif intent in ("free_material", "interest"):
-            await send_materials_link(context.bot, update.effective_chat.id)
-            await send_text(context.bot, update.effective_chat.id, ad_message_text())
+            await send_materials(context.bot, update.effective_chat.id)
+            await send_text(context.bot, update.effective_chat.id, templates.AD_TEXT)
         else:
-            await update.message.reply_text("Unrecognized option. Reply 1 for consultation, or 2 for free materials, or send /start to restart.")
+            await reply_text(update, templates.UNRECOGNIZED_TEXT)
             return INTENT
 
         return ConversationHandler.END
 
+    @metrics.timed_handler("cancel")
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-        await update.message.reply_text("Canceled. Use /start to begin again.")
+        await reply_text(update, templates.CANCEL_TEXT)
         return ConversationHandler.END
 
-    def run(self) -> None:
-        app = ApplicationBuilder().token(self.token).build()
+    async def help(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await reply_text(update, templates.HELP_TEXT)
+
+    async def stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        # Telegram rejects messages over 4096 characters
+        await reply_text(update, metrics.summary()[:4096])
+
+    async def _post_init(self, app: Application) -> None:
+        startup.mark("initialized")
+        await self.dispatcher.start()
+        outbound.install(self.dispatcher)
+        await self.writer.start()
+        if METRICS_PORT:
+            self.metrics_server = await metrics.serve_metrics(METRICS_LISTEN, METRICS_PORT)
+            logger.info("Metrics at http://%s:%d/metrics", METRICS_LISTEN, METRICS_PORT)
+        # post_init runs before polling or the webhook starts; anything the first
+        # update does not need waits until updates are being served
+        self._deferred_startup = asyncio.create_task(self._after_start(app))
+
+    async def _after_start(self, app: Application) -> None:
+        while not app.running:
+            await asyncio.sleep(0.05)
+        startup.mark("serving")
+        logger.info("Serving updates %.0f ms after process start", startup.since_start() * 1000)
+        # until the index is loaded, user lookups go to the database
+        await asyncio.to_thread(user_index.load)
+        startup.mark("user index loaded")
+        await self.broadcast_startup(app.bot)
+
+    async def _report_startup(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if not any(name == "first update" for name, _ in startup.milestones):
+            startup.mark("first update")
+            logger.info("%s", startup.report())
+
+    async def _post_stop(self, app: Application) -> None:
+        # an unfinished startup broadcast resumes from its checkpoint next time
+        if self._deferred_startup is not None:
+            self._deferred_startup.cancel()
+            await asyncio.gather(self._deferred_startup, return_exceptions=True)
+            self._deferred_startup = None
+        # handlers have finished: save interaction records and conversation state before the
+        # drain below, which may run until stop.sh gives up and kills the process
+        await self.writer.stop()
+        await app.update_persistence()
+        if app.persistence is not None:
+            await app.persistence.flush()
+        # drain queued sends while the bot's HTTP client is still open
+        await self.dispatcher.stop(timeout=DRAIN_TIMEOUT)
+        outbound.install(None)
+
+    async def _post_shutdown(self, app: Application) -> None:
+        # the Application's requests leave the shared client open; nothing uses it after shutdown
+        await httpclient.aclose()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            await self.metrics_server.wait_closed()
+            self.metrics_server = None
+
+    async def broadcast_startup(self, bot: Bot) -> None:
+        """Send a one-time startup message to previously recorded users."""
+        from broadcast import broadcast, campaign_id
+
+        try:
+            user_ids = await asyncio.to_thread(load_user_ids)
+        except Exception:
+            logger.debug("Could not load recorded users for startup broadcast")
+            return
+        # the id is tied to the message content, so each distinct announcement is delivered once
+        broadcast_id = os.getenv("STARTUP_BROADCAST_ID") or campaign_id("startup", templates.STARTUP_TEXT)
+        # the same keyboard goes to every recipient, so it is sent pre-serialized
+        await broadcast(
+            bot, user_ids, templates.STARTUP_TEXT, reply_markup=templates.MAIN_KEYBOARD_JSON, broadcast_id=broadcast_id
+        )
+
+    def build_application(self) -> Application:
+        builder = ApplicationBuilder().token(self.token)
+        if self.request is not None:
+            builder = builder.request(self.request)
+        else:
+            # sends and getUpdates share one connection pool; every Bot API call is timed per method
+            builder = builder.request(httpclient.InstrumentedRequest()).get_updates_request(
+                httpclient.InstrumentedRequest()
+            )
+        if self.base_url:
+            builder = builder.base_url(self.base_url)
+        app = (
+            builder
+            .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+            # conversation state and user_data survive restarts
+            .persistence(
+                SQLitePersistence(store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False))
+            )
+            .post_init(self._post_init)
+            .post_stop(self._post_stop)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
 
         conv = ConversationHandler(
             entry_points=[CommandHandler("start", self.start)],
             states={INTENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.intent_handler)]},
             fallbacks=[CommandHandler("cancel", self.cancel)],
             allow_reentry=True,
+            name="intent_flow",
+            persistent=True,
         )
         app.add_handler(conv)
-        app.add_handler(CommandHandler("help", lambda u, c: u.message.reply_text("Use /start to begin")))
+        if startup.ENABLED:
+            app.add_handler(TypeHandler(Update, self._report_startup, block=False), group=-1)
+        app.add_handler(CommandHandler("stats", self.stats, filters=filters.User(user_id=ADMIN_IDS)))
+        app.add_handler(CommandHandler("help", self.help))
+        return app
 
-        # send a one-time startup message to previously recorded users using the synchronous Bot
-        try:
-            user_ids = load_user_ids()
-            # prefer requests if available
-            try:
-                import requests
-                import json
-
-                base = f"https://api.telegram.org/bot{self.token}/sendMessage"
-                reply_markup = json.dumps({
-                    "keyboard": [["Tutoring consultation", "Free Chinese materials"]],
-                    "one_time_keyboard": True,
-                    "resize_keyboard": True,
-                })
-                for uid in user_ids:
-                    try:
-                        requests.post(
-                            base,
-                            data={
-                                "chat_id": uid,
-                                "text": (
-                                    "Hello! I am Midas Chinese Tutor Bot.\n"
-                                    "If you want a tutoring consultation, tap 'Tutoring consultation'.\n"
-                                    "If you want free Chinese learning materials, tap 'Free Chinese materials'."
-                                ),
-                                "reply_markup": reply_markup,
-                            },
-                            timeout=5,
-                        )
-                    except Exception as e:
-                        logger.debug("Failed to send startup message to %s: %s", uid, e)
-            except Exception:
-                # fallback to urllib
-                import urllib.parse
-                import urllib.request
-
-                import json
-                reply_markup = json.dumps({
-                    "keyboard": [["Tutoring consultation", "Free Chinese materials"]],
-                    "one_time_keyboard": True,
-                    "resize_keyboard": True,
-                })
-                for uid in user_ids:
-                    try:
-                        params = {
-                            "chat_id": uid,
-                            "text": (
-                                "Hello! I am Midas Chinese Tutor Bot.\n"
-                                "If you want a tutoring consultation, tap 'Tutoring consultation'.\n"
-                                "If you want free Chinese learning materials, tap 'Free Chinese materials'."
-                            ),
-                            "reply_markup": reply_markup,
-                        }
-                        data = urllib.parse.urlencode(params).encode()
-                        urllib.request.urlopen(f"https://api.telegram.org/bot{self.token}/sendMessage", data=data, timeout=5)
-                    except Exception as e:
-                        logger.debug("Failed to send startup message to %s: %s", uid, e)
-        except Exception:
-            logger.debug("Could not send startup messages via HTTP")
+    def run(self) -> None:
+        app = self.build_application()
+        if BOT_MODE == "webhook" and os.getenv("WEBHOOK_URL"):
+            from webhook import run_webhook
 
+            logger.info("Bot starting (webhook)")
+            asyncio.run(
+                run_webhook(
+                    app,
+                    webhook_url=os.environ["WEBHOOK_URL"],
+                    listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+                    port=int(os.getenv("WEBHOOK_PORT", "8443")),
+                    path=os.getenv("WEBHOOK_PATH", "/telegram"),
+                    secret_token=os.getenv("WEBHOOK_SECRET"),
+                    certfile=os.getenv("WEBHOOK_CERT"),
+                    keyfile=os.getenv("WEBHOOK_KEY"),
+                )
+            )
+            return
+        if BOT_MODE == "webhook":
+            logger.warning("BOT_MODE=webhook but WEBHOOK_URL is not set; using polling")
         logger.info("Bot starting")
         app.run_polling()
 
 
 if __name__ == "__main__":
+    import logsetup
+
+    # log records are written by a background thread to a rotating bot.log
+    logsetup.configure_from_env()
     BotApp(TOKEN).run()
  
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""Logging for the bot process without blocking the event loop.
+
+Loggers hand records to a QueueHandler, which only enqueues them. A
+QueueListener thread formats and writes them to bot.log, rotated by size, and
+to stderr when it is a terminal. Output is plain text or compact JSON lines.
+
+High-volume messages are sampled before they reach the queue. Each message
+template (logger + format string) may log `burst` records per `interval`
+seconds. Further records are dropped and counted, and the next record that gets
+through carries the count. Errors are never sampled. httpx's per-request INFO
+lines are turned off.
+
+Configured from the environment by `configure_from_env()`:
+    BOT_LOG_LEVEL      INFO
+    BOT_LOG_FILE       bot.log next to this file; empty to disable
+    BOT_LOG_MAX_BYTES  10485760, rotate when bot.log grows past this
+    BOT_LOG_BACKUPS    5 rotated files kept
+    BOT_LOG_FORMAT     "text" or "json"
+    BOT_LOG_CONSOLE    1/0; by default only when stderr is a terminal
+    BOT_LOG_BURST      20 records per message template per interval
+    BOT_LOG_INTERVAL   10 seconds
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+BOT_LOG = Path(__file__).parent / "bot.log"
+MAX_BYTES = 10 << 20
+BACKUPS = 5
+SAMPLE_BURST = 20
+SAMPLE_INTERVAL = 10.0
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# libraries that log every request at INFO
+NOISY_LOGGERS = ("httpx", "httpcore")
+
+
+class JSONFormatter(logging.Formatter):
+    """One compact JSON object per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+class SamplingFilter(logging.Filter):
+    """Let at most `burst` records per message template through every `interval` seconds.
+
+    Records at `always_level` or above are never dropped. The first record let
+    through after a dropped run gets a `suppressed` attribute with the count.
+    """
+
+    def __init__(self, burst: int = SAMPLE_BURST, interval: float = SAMPLE_INTERVAL, always_level: int = logging.ERROR):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.always_level = always_level
+        # (logger, template) -> [window start, records in window, dropped since last pass]
+        self._windows: dict[tuple[str, object], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.always_level:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            dropped = window[2] if window else 0
+            if len(self._windows) > 10_000:
+                # templates built with f-strings never repeat; do not keep them forever
+                self._windows.clear()
+            window = self._windows[key] = [now, 0, dropped]
+        window[1] += 1
+        if window[1] > self.burst:
+            window[2] += 1
+            return False
+        if window[2]:
+            record.suppressed = window[2]
+            window[2] = 0
+        return True
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} [{suppressed} similar suppressed]" if suppressed else text
+
+
+def configure_logging(
+    level: int = logging.INFO,
+    log_file: Optional[Path] = BOT_LOG,
+    max_bytes: int = MAX_BYTES,
+    backups: int = BACKUPS,
+    json_lines: bool = False,
+    console: Optional[bool] = None,
+    burst: int = SAMPLE_BURST,
+    interval: float = SAMPLE_INTERVAL,
+) -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a listener thread; returns the started listener."""
+    formatter = JSONFormatter() if json_lines else _TextFormatter(TEXT_FORMAT)
+    handlers: list[logging.Handler] = []
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        handlers.append(file_handler)
+    if console if console is not None else (sys.stderr.isatty() or not handlers):
+        handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(burst, interval))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(max(level, logging.WARNING))
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # QueueListener.stop() drains the queue, so nothing logged before exit is lost
+    atexit.register(listener.stop)
+    return listener
+
+
+def configure_from_env() -> logging.handlers.QueueListener:
+    log_file = os.getenv("BOT_LOG_FILE")
+    console = os.getenv("BOT_LOG_CONSOLE")
+    return configure_logging(
+        level=logging.getLevelName(os.getenv("BOT_LOG_LEVEL", "INFO").upper()),
+        log_file=BOT_LOG if log_file is None else (Path(log_file) if log_file else None),
+        max_bytes=int(os.getenv("BOT_LOG_MAX_BYTES") or MAX_BYTES),
+        backups=int(os.getenv("BOT_LOG_BACKUPS") or BACKUPS),
+        json_lines=os.getenv("BOT_LOG_FORMAT", "text") == "json",
+        console=None if console is None else console not in ("", "0"),
+        burst=int(os.getenv("BOT_LOG_BURST") or SAMPLE_BURST),
+        interval=float(os.getenv("BOT_LOG_INTERVAL") or SAMPLE_INTERVAL),
+    )
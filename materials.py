@@ -1,11 +1,273 @@
-GDRIVE_SHARE_LINK = "https://drive.google.com/drive/folders/1qiDmq1P73WgdN9i48-KMuVitl8SV5wN0?usp=drive_link"
+from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from telegram import InputMediaDocument
+from telegram.error import BadRequest, NetworkError
+
+import outbound
+from templates import MATERIALS_LINK_TEXT
+from ttlcache import open_ttl_store
+
+logger = logging.getLogger(__name__)
+
+
+# "link" sends the Google Drive URL; "files" sends the documents in MATERIALS_DIR natively
+MATERIALS_MODE = os.getenv("MATERIALS_MODE", "link")
+MATERIALS_DIR = Path(os.getenv("MATERIALS_DIR") or Path(__file__).parent / "material_files")
+FILE_ID_INDEX = Path(__file__).parent / "material_file_ids.json"
+MEDIA_GROUP_SIZE = 10  # Telegram's maximum items per sendMediaGroup
+BATCH_RETRIES = 3
+
+RECENT_SEND_TTL = 300.0  # seconds
+RECENT_SEND_MAX_ENTRIES = 100_000
+# "memory" keeps the table in this process; "sqlite" shares it between bot instances on one machine
+RECENT_SEND_BACKEND = os.getenv("RECENT_SEND_BACKEND", "memory")
+RECENT_SEND_DB = Path(os.getenv("RECENT_SEND_DB") or Path(__file__).parent / "recent_sends.db")
+
+_recent_sends = None
+
+
+def recent_sends():
+    """The recent-send TTL store, keyed by "chat_id:key"; opened on first use."""
+    global _recent_sends
+    if _recent_sends is None:
+        _recent_sends = open_ttl_store(
+            RECENT_SEND_BACKEND, ttl=RECENT_SEND_TTL, maxsize=RECENT_SEND_MAX_ENTRIES, path=RECENT_SEND_DB
+        )
+    return _recent_sends
+
+
+# SQLite claims commit to disk; run them in a worker thread so a slow fsync or a lock
+# held by another instance never stalls the event loop. In-memory checks stay inline.
+async def _claim_recent(key: str) -> bool:
+    if RECENT_SEND_BACKEND == "sqlite":
+        return await asyncio.to_thread(lambda: recent_sends().claim(key))
+    return recent_sends().claim(key)
+
+
+async def _discard_recent(key: str) -> None:
+    if RECENT_SEND_BACKEND == "sqlite":
+        await asyncio.to_thread(lambda: recent_sends().discard(key))
+    else:
+        recent_sends().discard(key)
+
+
+async def send_materials_link(bot, chat_id: int, text: str = MATERIALS_LINK_TEXT) -> dict:
+    """Send the Google Drive link to chat unless it went out recently. Returns a simple stats dict."""
+    # claiming before sending stops two instances sharing the table from both sending
+    key = f"{chat_id}:gdrive_link"
+    if not await _claim_recent(key):
+        logger.info("Skipping sending drive link to %s because it was sent recently", chat_id)
+        return {"sent": 0, "skipped": 1, "errors": 0}
+
+    async def call():
+        try:
+            return await bot.send_message(chat_id=chat_id, text=text)
+        except Exception:
+            # release the claim so a retry is not mistaken for a duplicate
+            await _discard_recent(key)
+            raise
 
-async def send_materials_link(bot, chat_id: int) -> dict:
-    """Send the Google Drive link to chat. Returns a simple stats dict."""
     try:
-        text = "Here are the learning materials in Google Drive:"  
-        await bot.send_message(chat_id=chat_id, text=f"{text}\n{GDRIVE_SHARE_LINK}")
-        return {"sent": 1}
-    except Exception:
-        return {"sent": 0}
+        await outbound.send(chat_id, call)
+        return {"sent": 1, "skipped": 0, "errors": 0}
+    except Exception as e:
+        logger.exception("Failed to send drive link to %s -> %s", chat_id, e)
+        return {"sent": 0, "skipped": 0, "errors": 1}
+
+
+class FileIdIndex:
+    """Persistent content-hash -> Telegram file_id map for material files.
+
+    A file is uploaded once; later sends reuse the file_id Telegram returned for
+    the same content. File hashes are cached by (size, mtime) so unchanged files
+    are not re-read, and an edited file gets a new hash and is uploaded again.
+    """
+
+    def __init__(self, path: Path = FILE_ID_INDEX):
+        self.path = path
+        self._file_ids: dict[str, str] = {}
+        self._hashes: dict[str, tuple[int, int, str]] = {}
+        self._loaded = False
+        self._dirty = False
+        # scan() and save() run in worker threads while handlers call get()/set()
+        self._lock = threading.RLock()
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.path.exists():
+                return
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                logger.warning("Ignoring unreadable file_id index %s", self.path)
+                return
+            self._file_ids = dict(data.get("file_ids", {}))
+            self._hashes = {name: tuple(entry) for name, entry in data.get("hashes", {}).items()}
+
+    def digest(self, path: Path) -> str:
+        """sha256 of the file, reusing the cached value while size and mtime are unchanged."""
+        self._load()
+        st = path.stat()
+        name = str(path)
+        cached = self._hashes.get(name)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        if cached and cached[2] != digest:
+            # content changed: forget the old upload unless another file still has that content
+            if all(entry[2] != cached[2] for other, entry in self._hashes.items() if other != name):
+                self._file_ids.pop(cached[2], None)
+        self._hashes[name] = (st.st_size, st.st_mtime_ns, digest)
+        self._dirty = True
+        return digest
+
+    def scan(self, directory: Path) -> list[tuple[Path, str]]:
+        """Return (path, digest) for every regular file in `directory`, sorted by name."""
+        if not directory.is_dir():
+            return []
+        paths = [p for p in sorted(directory.iterdir()) if p.is_file() and not p.name.startswith(".")]
+        with self._lock:
+            return [(p, self.digest(p)) for p in paths]
+
+    def get(self, digest: str) -> str | None:
+        self._load()
+        return self._file_ids.get(digest)
+
+    def set(self, digest: str, file_id: str) -> None:
+        self._load()
+        with self._lock:
+            self._file_ids[digest] = file_id
+            self._dirty = True
+
+    def forget(self, digest: str) -> None:
+        self._load()
+        with self._lock:
+            if self._file_ids.pop(digest, None) is not None:
+                self._dirty = True
+
+    def save(self) -> None:
+        """Atomically rewrite the index file if anything changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            text = json.dumps(
+                {"file_ids": self._file_ids, "hashes": {name: list(entry) for name, entry in self._hashes.items()}},
+                indent=1,
+            )
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+file_id_index = FileIdIndex()
+
+
+async def _send_document(bot, chat_id: int, path: Path, digest: str, stats: dict) -> None:
+    file_id = file_id_index.get(digest)
+    if file_id is not None:
+        try:
+            await outbound.request(chat_id, lambda: bot.send_document(chat_id=chat_id, document=file_id))
+            stats["sent"] += 1
+            return
+        except BadRequest as e:
+            # the cached id is no longer accepted; upload the file again
+            logger.info("Cached file_id for %s rejected (%s); re-uploading", path.name, e)
+            file_id_index.forget(digest)
+    document = await asyncio.to_thread(path.read_bytes)
+    message = await outbound.request(
+        chat_id, lambda: bot.send_document(chat_id=chat_id, document=document, filename=path.name)
+    )
+    file_id_index.set(digest, message.document.file_id)
+    stats["sent"] += 1
+    stats["uploaded"] += 1
+
+
+def _media_item(path: Path, digest: str) -> InputMediaDocument:
+    file_id = file_id_index.get(digest)
+    if file_id is not None:
+        return InputMediaDocument(media=file_id)
+    # InputMediaDocument reads the file content up front, so the handle can be closed here
+    with path.open("rb") as f:
+        return InputMediaDocument(media=f, filename=path.name)
+
+
+async def _send_group(bot, chat_id: int, batch: list[tuple[Path, str]], stats: dict) -> None:
+    """Send one media group, retrying the whole batch on stale file_ids and network errors.
+
+    Flood control is left to the outbound dispatcher, which retries RetryAfter itself
+    and pauses every sender.
+    """
+    for attempt in range(BATCH_RETRIES + 1):
+        media = await asyncio.to_thread(lambda: [_media_item(path, digest) for path, digest in batch])
+        try:
+            messages = await outbound.request(chat_id, lambda: bot.send_media_group(chat_id=chat_id, media=media))
+        except BadRequest:
+            # one of the cached ids may be stale; retry the batch with fresh uploads
+            if attempt == BATCH_RETRIES or not any(file_id_index.get(digest) for _, digest in batch):
+                raise
+            for _, digest in batch:
+                file_id_index.forget(digest)
+            continue
+        except NetworkError:
+            if attempt == BATCH_RETRIES:
+                raise
+            await asyncio.sleep(2**attempt)
+            continue
+        for (path, digest), item, message in zip(batch, media, messages):
+            if not isinstance(item.media, str):
+                file_id_index.set(digest, message.document.file_id)
+                stats["uploaded"] += 1
+        stats["sent"] += len(batch)
+        return
+
+
+async def send_material_files(bot, chat_id: int, directory: Path = MATERIALS_DIR) -> dict:
+    """Send every file in `directory` as Telegram documents, uploading each file only once.
+
+    Files go out in media groups of up to MEDIA_GROUP_SIZE, so a whole pack costs one
+    request per ten files. A group that still fails after retries is counted in errors
+    and the remaining groups are still sent.
+    """
+    stats = {"sent": 0, "uploaded": 0, "errors": 0, "batches": 0}
+    files = await asyncio.to_thread(file_id_index.scan, directory)
+    for start in range(0, len(files), MEDIA_GROUP_SIZE):
+        batch = files[start : start + MEDIA_GROUP_SIZE]
+        stats["batches"] += 1
+        try:
+            if len(batch) == 1:
+                # a media group needs at least two items
+                await _send_document(bot, chat_id, *batch[0], stats)
+            else:
+                await _send_group(bot, chat_id, batch, stats)
+        except Exception as e:
+            logger.exception("Failed to send %d material files to %s -> %s", len(batch), chat_id, e)
+            stats["errors"] += len(batch)
+    await asyncio.to_thread(file_id_index.save)
+    return stats
+
+
+async def send_materials(bot, chat_id: int) -> dict:
+    """Deliver learning materials using MATERIALS_MODE, falling back to the Drive link."""
+    if MATERIALS_MODE == "files":
+        stats = await send_material_files(bot, chat_id)
+        if stats["sent"]:
+            return stats
+    return await send_materials_link(bot, chat_id)
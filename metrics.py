@@ -0,0 +1,226 @@
+"""In-process counters and latency histograms with a Prometheus text endpoint.
+
+Recording is a dict lookup and an integer increment (plus a bisect for
+histograms), with no locks, formatting or I/O; all of that happens only when
+`render()` is called by a scrape or by /stats. Metric families are module-level
+objects, and hot paths keep a reference to the child for their labels:
+
+    HANDLER_SECONDS.labels("start").observe(elapsed)
+
+Series whose values live elsewhere (e.g. the outbound queue depth) are
+registered as collectors and read only at scrape time. Bot API calls are timed
+by httpclient.InstrumentedRequest.
+
+Only the standard library and httpserver are imported here, so storage modules
+(users.py) and their CLIs can record metrics without loading httpx or telegram.
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import math
+import time
+from typing import Callable, Iterable, Optional
+
+from httpserver import Request, Response, serve, text_response
+
+# seconds; from handlers that only queue replies (~100 µs) up to slow Bot API calls
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = tuple[str, dict[str, str], float]
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf if it is past the last bound)."""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return math.inf
+
+
+class Family:
+    """A named metric with one child per combination of label values."""
+
+    def __init__(self, kind: str, name: str, help: str, labelnames: tuple[str, ...], factory: Callable):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._factory = factory
+        self.children: dict[tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            child = self.children[values] = self._factory()
+        return child
+
+
+class Registry:
+    def __init__(self):
+        self.families: dict[str, Family] = {}
+        self.collectors: list[tuple[str, str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def _family(self, kind: str, name: str, help: str, labelnames: tuple[str, ...], factory: Callable) -> Family:
+        if name in self.families:
+            raise ValueError(f"metric {name} is already registered")
+        family = self.families[name] = Family(kind, name, help, labelnames, factory)
+        return family
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Family:
+        return self._family("counter", name, help, labelnames, Counter)
+
+    def histogram(
+        self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Family:
+        return self._family("histogram", name, help, labelnames, functools.partial(Histogram, tuple(buckets)))
+
+    def collector(self, name: str, kind: str, help: str, collect: Callable[[], Iterable[Sample]]) -> None:
+        """Register `collect()`, called at scrape time, for series kept outside this registry."""
+        self.collectors.append((name, kind, help, collect))
+
+    def render(self) -> str:
+        """All series in the Prometheus text exposition format."""
+        lines: list[str] = []
+        for family in self.families.values():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, child in family.children.items():
+                labels = dict(zip(family.labelnames, values))
+                if isinstance(child, Histogram):
+                    cumulative = 0
+                    for bound, n in zip((*child.bounds, math.inf), child.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == math.inf else repr(bound)
+                        lines.append(_sample(f"{family.name}_bucket", {**labels, "le": le}, cumulative))
+                    lines.append(_sample(f"{family.name}_sum", labels, child.sum))
+                    lines.append(_sample(f"{family.name}_count", labels, child.count))
+                else:
+                    lines.append(_sample(family.name, labels, child.value))
+        for name, kind, help, collect in self.collectors:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(_sample(sample_name, labels, value) for sample_name, labels, value in collect())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _sample(name: str, labels: dict[str, str], value: float) -> str:
+    if labels:
+        name += "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+    return f"{name} {value!r}"
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram("bot_handler_seconds", "Time spent in each update handler", ("handler",))
+HANDLER_ERRORS = REGISTRY.counter("bot_handler_errors_total", "Handler calls that raised", ("handler",))
+INTENTS = REGISTRY.counter("bot_intents_total", "Parsed intents", ("intent",))
+INTENT_SECONDS = REGISTRY.histogram("bot_intent_seconds", "Time spent handling each intent", ("intent",))
+API_SECONDS = REGISTRY.histogram("telegram_api_seconds", "Bot API call latency", ("method",))
+API_RESPONSES = REGISTRY.counter("telegram_api_responses_total", "Bot API responses by HTTP status", ("method", "status"))
+USERS_WRITE_SECONDS = REGISTRY.histogram("users_write_seconds", "Time to write a batch of interaction records")
+USERS_WRITTEN = REGISTRY.counter("users_records_written_total", "Interaction records written to users.db")
+
+
+def timed_handler(name: str):
+    """Decorator recording an async handler's latency and errors under `name`."""
+    histogram = HANDLER_SECONDS.labels(name)
+    errors = HANDLER_ERRORS.labels(name)
+
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorate
+
+
+def summary(registry: Registry = REGISTRY) -> str:
+    """Short plain-text digest of the histograms and counters, for chat."""
+    lines = []
+    for family in registry.families.values():
+        for values, child in sorted(family.children.items()):
+            label = f"{family.name}[{','.join(values)}]" if values else family.name
+            if isinstance(child, Histogram):
+                if child.count:
+                    lines.append(
+                        f"{label}: n={child.count} avg={child.sum / child.count * 1000:.2f}ms "
+                        f"p50<={child.quantile(0.5) * 1000:g}ms p99<={child.quantile(0.99) * 1000:g}ms"
+                    )
+            elif child.value:
+                lines.append(f"{label}: {child.value}")
+    return "\n".join(lines) or "No metrics recorded yet."
+
+
+async def serve_metrics(host: str, port: int, registry: Registry = REGISTRY, path: str = "/metrics"):
+    """Expose `registry` at http://host:port/metrics; returns the asyncio.Server."""
+
+    async def handle(request: Request) -> Response:
+        if request.path != path:
+            return text_response(404)
+        return text_response(200, registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+
+    return await serve(handle, host, port)
+
+
+def register_dispatcher(dispatcher_getter: Callable[[], Optional[object]], registry: Registry = REGISTRY) -> None:
+    """Export the outbound dispatcher's queue depth and counters at scrape time."""
+
+    def pending() -> Iterable[Sample]:
+        dispatcher = dispatcher_getter()
+        if dispatcher is not None:
+            yield "outbound_pending", {}, dispatcher.pending()
+
+    def totals() -> Iterable[Sample]:
+        dispatcher = dispatcher_getter()
+        if dispatcher is not None:
+            for outcome, value in dispatcher.stats.items():
+                yield "outbound_messages_total", {"outcome": outcome}, value
+
+    registry.collector("outbound_pending", "gauge", "Messages waiting in the outbound queue", pending)
+    registry.collector("outbound_messages_total", "counter", "Outbound dispatcher totals", totals)
@@ -0,0 +1,206 @@
+"""Central outbound queue for Bot API calls.
+
+Every send is submitted as a zero-argument coroutine factory for a chat. The
+dispatcher keeps one FIFO per chat, so a chat's messages always arrive in order.
+Chats that have work waiting are served by priority (interactive replies before
+broadcasts) through a fixed pool of workers. A global token bucket and a
+per-chat bucket keep the bot under Telegram's limits, and RetryAfter pauses all
+sends and retries the same call.
+
+Handlers use `send()` and return as soon as the call is queued; `request()` waits
+for the API result, e.g. the file_id of an upload. Without an installed
+dispatcher both call the Bot directly. Callers that keep their own statistics
+(the broadcast engine) pass `on_throttle` to hear about each RetryAfter the
+dispatcher absorbed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from telegram.error import RetryAfter
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BROADCAST = 1
+
+GLOBAL_RATE = 30.0  # messages per second across all chats
+PER_CHAT_RATE = 1.0  # sustained messages per second to one chat
+PER_CHAT_BURST = 3.0  # a reply of two or three messages goes out without waiting
+WORKERS = 16
+MAX_RETRIES = 3
+# per-chat buckets idle this long are dropped; by then they are full again anyway
+CHAT_BUCKET_IDLE = 60.0
+
+Call = Callable[[], Awaitable]
+OnThrottle = Optional[Callable[[], None]]
+
+
+class OutboundDispatcher:
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        per_chat_rate: float = PER_CHAT_RATE,
+        per_chat_burst: float = PER_CHAT_BURST,
+        workers: int = WORKERS,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.workers = workers
+        self.max_retries = max_retries
+        self._chats: dict[int, deque] = {}
+        self._buckets: dict[int, tuple[TokenBucket, float]] = {}
+        self._ready: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+        self.stats = {"submitted": 0, "sent": 0, "failed": 0, "throttled": 0}
+
+    def submit(
+        self, chat_id: int, call: Call, priority: int = INTERACTIVE, on_throttle: OnThrottle = None
+    ) -> asyncio.Future:
+        """Queue `call` for `chat_id` and return a future for its result.
+
+        `on_throttle` is called each time the call hits a RetryAfter and is retried.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # handlers usually do not await sends; keep unobserved failures from warning at exit
+        future.add_done_callback(_consume_exception)
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = self._chats[chat_id] = deque()
+        queue.append((priority, call, future, on_throttle))
+        self.stats["submitted"] += 1
+        if len(queue) == 1:
+            # the chat was idle (not queued and not in flight): make it schedulable
+            self._schedule(chat_id, priority)
+        return future
+
+    def pending(self) -> int:
+        return sum(len(q) for q in self._chats.values())
+
+    def _schedule(self, chat_id: int, priority: int) -> None:
+        self._ready.put_nowait((priority, next(self._seq), chat_id))
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        entry = self._buckets.get(chat_id)
+        bucket = entry[0] if entry else TokenBucket(self.per_chat_rate, capacity=self.per_chat_burst)
+        self._buckets[chat_id] = (bucket, time.monotonic())
+        return bucket
+
+    def _sweep_buckets(self) -> None:
+        cutoff = time.monotonic() - CHAT_BUCKET_IDLE
+        for chat_id in [c for c, (_, used) in self._buckets.items() if used < cutoff and c not in self._chats]:
+            del self._buckets[chat_id]
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Give queued sends up to `timeout` seconds to go out, then cancel the workers."""
+        deadline = time.monotonic() + timeout
+        while self._chats and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._chats:
+            logger.warning("Dropping %d queued outbound messages at shutdown", self.pending())
+            for queue in self._chats.values():
+                for _, _, future, _ in queue:
+                    future.cancel()
+            self._chats.clear()
+            self._ready = asyncio.PriorityQueue()
+
+    async def _sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(CHAT_BUCKET_IDLE)
+            self._sweep_buckets()
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, chat_id = await self._ready.get()
+            queue = self._chats[chat_id]
+            _, call, future, on_throttle = queue[0]
+            try:
+                await self._chat_bucket(chat_id).acquire()
+                result = await self._call(call, on_throttle)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.warning("Outbound send to %s failed: %s", chat_id, e)
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.stats["sent"] += 1
+                if not future.done():
+                    future.set_result(result)
+            queue.popleft()
+            if queue:
+                self._schedule(chat_id, queue[0][0])
+            else:
+                del self._chats[chat_id]
+
+    async def _call(self, call: Call, on_throttle: OnThrottle = None):
+        for attempt in range(self.max_retries + 1):
+            await self.global_bucket.acquire()
+            try:
+                return await call()
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                # flood control is per bot: stop every worker for the requested time
+                self.stats["throttled"] += 1
+                if on_throttle is not None:
+                    on_throttle()
+                self.global_bucket.pause(float(e.retry_after))
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+_dispatcher: Optional[OutboundDispatcher] = None
+
+
+def install(dispatcher: Optional[OutboundDispatcher]) -> None:
+    """Route `send()` through `dispatcher` (None restores direct calls)."""
+    global _dispatcher
+    _dispatcher = dispatcher
+
+
+def get_dispatcher() -> Optional[OutboundDispatcher]:
+    return _dispatcher
+
+
+async def send(chat_id: int, call: Call, priority: int = INTERACTIVE) -> None:
+    """Queue `call` and return without waiting for delivery.
+
+    Without an installed dispatcher the call is made directly.
+    """
+    if _dispatcher is None:
+        await call()
+    else:
+        _dispatcher.submit(chat_id, call, priority)
+
+
+async def request(chat_id: int, call: Call, priority: int = INTERACTIVE, on_throttle: OnThrottle = None):
+    """Queue `call` and wait for its result (e.g. the Message carrying a new file_id)."""
+    if _dispatcher is None:
+        return await call()
+    return await _dispatcher.submit(chat_id, call, priority, on_throttle)
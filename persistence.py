@@ -0,0 +1,201 @@
+"""SQLite-backed persistence for conversation state and user/chat/bot data.
+
+The Application hands changed data to `update_*` every `update_interval` seconds;
+those calls only record the change in memory. A single background task then
+writes everything pending in one transaction from a worker thread, so handlers
+never wait on disk. Reads happen once per kind, in a worker thread, the first
+time the Application asks for them. Conversation tables are only read for
+handlers that are actually registered as persistent.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+PERSISTENCE_DB = Path(os.getenv("BOT_STATE_DB") or Path(__file__).parent / "bot_state.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS kv (name TEXT PRIMARY KEY, data BLOB NOT NULL);
+"""
+
+# sentinel for "delete this row" in the pending-write tables
+_DROP = object()
+
+
+class SQLitePersistence(BasePersistence):
+    def __init__(
+        self,
+        path: Path = PERSISTENCE_DB,
+        store_data: Optional[PersistenceInput] = None,
+        update_interval: float = 5,
+    ):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending_conversations: Dict[tuple[str, str], Any] = {}
+        self._pending_user_data: Dict[int, Any] = {}
+        self._pending_chat_data: Dict[int, Any] = {}
+        self._pending_kv: Dict[str, Any] = {}
+        self._write_task: Optional[asyncio.Task] = None
+
+    # -- storage helpers (run in worker threads) --
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _write(self, conversations: dict, user_data: dict, chat_data: dict, kv: dict) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                for (name, key), state in conversations.items():
+                    if state is _DROP:
+                        conn.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, key))
+                    else:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                            (name, key, json.dumps(state)),
+                        )
+                for table, column, rows in (("user_data", "user_id", user_data), ("chat_data", "chat_id", chat_data)):
+                    for row_id, data in rows.items():
+                        if data is _DROP:
+                            conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (row_id,))
+                        else:
+                            conn.execute(
+                                f"INSERT OR REPLACE INTO {table} ({column}, data) VALUES (?, ?)",
+                                (row_id, pickle.dumps(data)),
+                            )
+                for name, data in kv.items():
+                    conn.execute("INSERT OR REPLACE INTO kv (name, data) VALUES (?, ?)", (name, pickle.dumps(data)))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # -- batching --
+
+    def _take_pending(self) -> tuple[dict, dict, dict, dict]:
+        pending = (self._pending_conversations, self._pending_user_data, self._pending_chat_data, self._pending_kv)
+        self._pending_conversations, self._pending_user_data, self._pending_chat_data, self._pending_kv = {}, {}, {}, {}
+        return pending
+
+    def _schedule_write(self) -> None:
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        # let the rest of this persistence round queue its changes first
+        await asyncio.sleep(0)
+        while True:
+            # changes recorded while a batch is being written go into the next batch
+            pending = self._take_pending()
+            if not any(pending):
+                return
+            try:
+                await asyncio.to_thread(self._write, *pending)
+            except Exception:
+                logger.exception("Failed to write persistence batch")
+
+    # -- loading --
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        rows = await asyncio.to_thread(self._query, "SELECT key, state FROM conversations WHERE name = ?", (name,))
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        rows = await asyncio.to_thread(self._query, "SELECT user_id, data FROM user_data")
+        return {user_id: pickle.loads(data) for user_id, data in rows}
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        rows = await asyncio.to_thread(self._query, "SELECT chat_id, data FROM chat_data")
+        return {chat_id: pickle.loads(data) for chat_id, data in rows}
+
+    async def _get_kv(self, name: str, default: Any) -> Any:
+        rows = await asyncio.to_thread(self._query, "SELECT data FROM kv WHERE name = ?", (name,))
+        return pickle.loads(rows[0][0]) if rows else default
+
+    async def get_bot_data(self) -> Any:
+        return await self._get_kv("bot_data", {})
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return await self._get_kv("callback_data", None)
+
+    # -- updates (memory only; written by the background task) --
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._pending_conversations[(name, json.dumps(list(key)))] = _DROP if new_state is None else new_state
+        self._schedule_write()
+
+    async def update_user_data(self, user_id: int, data: Any) -> None:
+        self._pending_user_data[user_id] = data
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        self._pending_chat_data[chat_id] = data
+        self._schedule_write()
+
+    async def update_bot_data(self, data: Any) -> None:
+        self._pending_kv["bot_data"] = data
+        self._schedule_write()
+
+    async def update_callback_data(self, data: Any) -> None:
+        self._pending_kv["callback_data"] = data
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_user_data[user_id] = _DROP
+        self._schedule_write()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._pending_chat_data[chat_id] = _DROP
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: Any) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Write anything still pending; called by the Application on shutdown."""
+        if self._write_task is not None:
+            await self._write_task
+        await asyncio.to_thread(self._write, *self._take_pending())
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -41,20 +41,29 @@ else
   PIP_CMD="pip3"
 fi
 
-# Install requirements if present
+# Install requirements if present; skipped when requirements.txt is unchanged since the last install
+REQ_STAMP="$SCRIPT_DIR/.requirements.sha256"
 if [ -f "$SCRIPT_DIR/requirements.txt" ]; then
-  echo "[pull_and_run] Installing requirements..."
-  $PIP_CMD install -r requirements.txt
+  req_hash=$(sha256sum requirements.txt | cut -d' ' -f1)
+  if [ -f "$REQ_STAMP" ] && [ "$(cat "$REQ_STAMP")" = "$req_hash" ]; then
+    echo "[pull_and_run] requirements.txt unchanged; skipping pip install."
+  else
+    echo "[pull_and_run] Installing requirements..."
+    $PIP_CMD install -r requirements.txt
+    echo "$req_hash" > "$REQ_STAMP"
+  fi
 else
   echo "[pull_and_run] No requirements.txt found; skipping pip install."
 fi
 
 # Start bot in background using nohup, write PID to bot.pid
+# The bot writes and rotates bot.log itself; bot.out only catches output outside logging (e.g. a crash)
 LOGFILE="$SCRIPT_DIR/bot.log"
+OUTFILE="$SCRIPT_DIR/bot.out"
 PIDFILE="$SCRIPT_DIR/bot.pid"
 
 echo "[pull_and_run] Starting telegram_bot.py (logs -> $LOGFILE)"
-nohup python3 "$SCRIPT_DIR/telegram_bot.py" >> "$LOGFILE" 2>&1 &
+nohup python3 "$SCRIPT_DIR/telegram_bot.py" >> "$OUTFILE" 2>&1 &
 bot_pid=$!
 
 echo $bot_pid > "$PIDFILE"
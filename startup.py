@@ -0,0 +1,103 @@
+"""Startup timeline for the bot process: milestones and an import profile.
+
+Milestones (`mark()`) are recorded as seconds since the process started. With
+BOT_STARTUP_REPORT=1, imports made while the bot module loads are also timed,
+in the style of `python -X importtime`. Once the first update has been
+handled, `report()` logs both the milestones and the slowest imports.
+
+Import this module before anything heavy so the import profile sees the rest.
+"""
+
+from __future__ import annotations
+
+import builtins
+import importlib.util
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("BOT_STARTUP_REPORT", "") not in ("", "0")
+REPORT_TOP = 15
+
+
+def _process_age() -> float:
+    """Seconds since this process started (Linux); 0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            # field 22, counted after the parenthesized command name
+            start_ticks = int(f.read().rsplit(b")", 1)[1].split()[19])
+        with open("/proc/uptime", "rb") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+_T0 = time.perf_counter()
+_AGE_AT_T0 = _process_age()
+
+milestones: list[tuple[str, float]] = []
+# module -> (inclusive seconds, self seconds), in first-import order
+imports: dict[str, tuple[float, float]] = {}
+_original_import = builtins.__import__
+_child_time: list[float] = []
+
+
+def since_start() -> float:
+    return _AGE_AT_T0 + time.perf_counter() - _T0
+
+
+def mark(name: str) -> None:
+    """Record that startup reached `name` now; the first mark of a name wins."""
+    if all(existing != name for existing, _ in milestones):
+        milestones.append((name, since_start()))
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level:
+        try:
+            absolute = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__"))
+        except (ImportError, ValueError):
+            absolute = name
+    else:
+        absolute = name
+    if absolute in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    _child_time.append(0.0)
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - started
+        children = _child_time.pop()
+        if _child_time:
+            _child_time[-1] += elapsed
+        if absolute in sys.modules and absolute not in imports:
+            imports[absolute] = (elapsed, elapsed - children)
+
+
+def start_import_timer() -> None:
+    builtins.__import__ = _timed_import
+
+
+def stop_import_timer() -> None:
+    """Stop timing; later (deferred) imports run at full speed and are not profiled."""
+    if builtins.__import__ is _timed_import:
+        builtins.__import__ = _original_import
+
+
+def report(top: int = REPORT_TOP) -> str:
+    lines = ["Startup timeline (ms since process start):"]
+    lines.extend(f"  {at * 1000:8.1f}  {name}" for name, at in milestones)
+    if imports:
+        lines.append(f"Slowest imports (ms, self / cumulative), {len(imports)} modules:")
+        slowest = sorted(imports.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        lines.extend(f"  {own * 1000:8.1f} / {total * 1000:8.1f}  {name}" for name, (total, own) in slowest)
+    return "\n".join(lines)
+
+
+if ENABLED:
+    start_import_timer()
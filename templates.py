@@ -0,0 +1,58 @@
+"""Message bodies and reply markup shared by the handlers and the broadcast path.
+
+Everything here is built once at import. Telegram objects are frozen after
+construction, so handlers can reuse them safely.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+from typing import Final
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+GDRIVE_SHARE_LINK: Final = "https://drive.google.com/drive/folders/1qiDmq1P73WgdN9i48-KMuVitl8SV5wN0?usp=drive_link"
+
+WELCOME_TEXT: Final = (
+    "Hello! I am Midas Chinese Tutor Bot.\n"
+    "If you want a tutoring consultation, tap 'Tutoring consultation'.\n"
+    "If you want free Chinese learning materials, tap 'Free Chinese materials'.\n"
+    "If you have any questions, feel free to contact me on Telegram or WhatsApp: 86549811.\n"
+    "Please choose an option by tapping a button or typing your choice:"
+)
+STARTUP_TEXT: Final = (
+    "Hello! I am Midas Chinese Tutor Bot.\n"
+    "If you want a tutoring consultation, tap 'Tutoring consultation'.\n"
+    "If you want free Chinese learning materials, tap 'Free Chinese materials'."
+)
+AD_TEXT: Final = (
+    "🎯 We offer high-quality online Chinese tutoring with native-speaking teachers. "
+    "Please complete this short form to get personalized assistance:\n"
+    "https://forms.gle/9dnyNMZmNGoDtr9a8\n\n"
+    "If you'd like to consult directly, reply 'Consult'."
+)
+MATERIALS_LINK_TEXT: Final = f"Here are the learning materials in Google Drive:\n{GDRIVE_SHARE_LINK}"
+# the material_sender wording, with a pointer to the administrator
+MATERIALS_LINK_HELP_TEXT: Final = (
+    f"{MATERIALS_LINK_TEXT}\n\nIf you cannot access them, please let the administrator know."
+)
+UNRECOGNIZED_TEXT: Final = (
+    "Unrecognized option. Reply 1 for consultation, or 2 for free materials, or send /start to restart."
+)
+CANCEL_TEXT: Final = "Canceled. Use /start to begin again."
+HELP_TEXT: Final = "Use /start to begin"
+
+MAIN_KEYBOARD: Final = ReplyKeyboardMarkup(
+    [["Tutoring consultation", "Free Chinese materials"]], one_time_keyboard=True, resize_keyboard=True
+)
+# For the startup broadcast only, which sends the same keyboard to every recipient:
+# PTB passes a str reply_markup through unchanged, so it is not serialized again per
+# message. That relies on PTB internals and is not a ReplyMarkup; handlers pass MAIN_KEYBOARD.
+MAIN_KEYBOARD_JSON: Final = json.dumps(MAIN_KEYBOARD.to_dict(), separators=(",", ":"))
+
+
+@functools.lru_cache(maxsize=128)
+def url_button(button_text: str, url: str) -> InlineKeyboardMarkup:
+    """A one-button inline keyboard, built once per (text, url)."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(button_text, url=url)]])
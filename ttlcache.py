@@ -0,0 +1,232 @@
+"""Bounded TTL sets for "don't repeat this within N seconds" checks.
+
+`TTLCache` is the in-process store; `SQLiteTTLStore` keeps the same state in a
+SQLite file so several bot processes on one machine share it. `open_ttl_store`
+picks one by name.
+
+In `TTLCache`, keys live in a dict mapping key -> expiry time, so membership
+checks are O(1). Expiry is amortized: every write pops the already-expired heads
+of a min-heap of (expiry, key) entries, so stale keys are removed globally, not
+only for the chat being served. When `maxsize` is reached the entry closest to
+expiry is evicted.
+"""
+
+from __future__ import annotations
+
+import heapq
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Hashable
+
+
+class TTLCache:
+    def __init__(self, ttl: float, maxsize: int = 100_000, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._clock = clock
+        self._expiry: dict[Hashable, float] = {}
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._counter = 0  # tie-breaker so keys never need to be comparable
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def __contains__(self, key: Hashable) -> bool:
+        expires = self._expiry.get(key)
+        if expires is not None and expires > self._clock():
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, key: Hashable) -> None:
+        """Mark `key` as seen now; it stays in the cache for `ttl` seconds."""
+        now = self._clock()
+        self.expire(now)
+        if key not in self._expiry:
+            while len(self._expiry) >= self.maxsize:
+                self._evict_one()
+        expires = now + self.ttl
+        self._expiry[key] = expires
+        self._counter += 1
+        heapq.heappush(self._heap, (expires, self._counter, key))
+        # re-adding a key leaves a stale heap entry; rebuild before they dominate
+        if len(self._heap) > 2 * len(self._expiry) + 64:
+            self._compact_heap()
+
+    def claim(self, key: Hashable) -> bool:
+        """Add `key` unless it is already live. Returns True if the caller now owns it."""
+        if key in self:
+            return False
+        self.add(key)
+        return True
+
+    def discard(self, key: Hashable) -> None:
+        self._expiry.pop(key, None)
+
+    def expire(self, now: float | None = None) -> int:
+        """Drop every entry whose TTL has passed. Returns how many were removed."""
+        now = self._clock() if now is None else now
+        heap, expiry = self._heap, self._expiry
+        removed = 0
+        while heap and heap[0][0] <= now:
+            expires, _, key = heapq.heappop(heap)
+            # skip heap entries superseded by a later add() or a discard()
+            if expiry.get(key) == expires:
+                del expiry[key]
+                removed += 1
+        self.expirations += removed
+        return removed
+
+    def _evict_one(self) -> None:
+        while self._heap:
+            expires, _, key = heapq.heappop(self._heap)
+            if self._expiry.get(key) == expires:
+                del self._expiry[key]
+                self.evictions += 1
+                return
+        # heap held only stale entries; fall back to any key
+        self._expiry.pop(next(iter(self._expiry)))
+        self.evictions += 1
+
+    def _compact_heap(self) -> None:
+        self._heap = [entry for entry in self._heap if self._expiry.get(entry[2]) == entry[0]]
+        heapq.heapify(self._heap)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._expiry),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteTTLStore:
+    """TTL set in a SQLite table, shared by every process that opens the same file.
+
+    Uses wall-clock expiry timestamps so entries survive restarts. `claim()` is a
+    single atomic upsert, so two processes cannot both win the same key. Keys are
+    stored as strings.
+    """
+
+    # purge expired rows every this many writes rather than on each one
+    PURGE_EVERY = 256
+
+    def __init__(self, path: Path, ttl: float, maxsize: int = 100_000, table: str = "ttl_entries"):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, expires REAL NOT NULL)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires ON {table} (expires)")
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                f"SELECT COUNT(*) FROM {self._table} WHERE expires > ?", (time.time(),)
+            ).fetchone()
+        return count
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT 1 FROM {self._table} WHERE key = ? AND expires > ?", (str(key), time.time())
+            ).fetchone()
+        if row is not None:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, key: Hashable) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, expires) VALUES (?, ?)", (str(key), now + self.ttl)
+            )
+            self._after_write(now)
+
+    def claim(self, key: Hashable) -> bool:
+        """Atomically add `key` unless another process holds a live entry for it."""
+        now = time.time()
+        with self._lock:
+            claimed = self._conn.execute(
+                f"INSERT INTO {self._table} (key, expires) VALUES (?, ?) "
+                f"ON CONFLICT (key) DO UPDATE SET expires = excluded.expires WHERE {self._table}.expires <= ?",
+                (str(key), now + self.ttl, now),
+            ).rowcount == 1
+            if claimed:
+                self._after_write(now)
+        if claimed:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return claimed
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (str(key),))
+
+    def expire(self, now: float | None = None) -> int:
+        with self._lock:
+            return self._purge(time.time() if now is None else now)
+
+    def _after_write(self, now: float) -> None:
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._purge(now)
+
+    def _purge(self, now: float) -> int:
+        removed = self._conn.execute(f"DELETE FROM {self._table} WHERE expires <= ?", (now,)).rowcount
+        self.expirations += removed
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()
+        if count > self.maxsize:
+            # drop the entries closest to expiry
+            self.evictions += self._conn.execute(
+                f"DELETE FROM {self._table} WHERE key IN "
+                f"(SELECT key FROM {self._table} ORDER BY expires LIMIT ?)",
+                (count - self.maxsize,),
+            ).rowcount
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
+
+
+def open_ttl_store(backend: str, ttl: float, maxsize: int = 100_000, path: Path | None = None):
+    """Return a TTL store: "memory" for this process only, "sqlite" to share it through `path`."""
+    if backend == "memory":
+        return TTLCache(ttl=ttl, maxsize=maxsize)
+    if backend == "sqlite":
+        if path is None:
+            raise ValueError("the sqlite backend needs a database path")
+        return SQLiteTTLStore(path, ttl=ttl, maxsize=maxsize)
+    raise ValueError(f"unknown TTL store backend {backend!r}")
@@ -0,0 +1,65 @@
+"""Concurrent update processing with per-user ordering.
+
+`PerUserUpdateProcessor` lets the Application handle updates from different users
+at the same time, up to `max_concurrent_updates`, while updates from one user
+run strictly one after another in arrival order. ConversationHandler state is
+kept per user, so it never sees two updates for the same conversation at once.
+
+Only the update at the head of each user's lane competes for a concurrency
+slot; the rest wait on the lane without holding one, so a user with a backlog
+cannot starve everyone else.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def _user_key(update: object) -> object:
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return ("chat", update.effective_chat.id)
+    # updates without a user (channel posts, polls, ...) share one lane
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    __slots__ = ("_lanes",)
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # key -> [lock, number of updates holding or waiting for it]
+        self._lanes: dict[object, list] = {}
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:  # type: ignore[misc]
+        # BaseUpdateProcessor.process_update takes the semaphore first, so updates queued
+        # behind their user's lock would sit on slots; take the lane first instead
+        key = _user_key(update)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = [asyncio.Lock(), 0]
+        lane[1] += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, which preserves arrival order per user
+            async with lane[0]:
+                async with self._semaphore:
+                    await self.do_process_update(update, coroutine)
+        finally:
+            lane[1] -= 1
+            if not lane[1]:
+                del self._lanes[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._lanes.clear()
@@ -1,43 +1,441 @@
 from __future__ import annotations
 
+import asyncio
 import csv
-from datetime import datetime, timezone
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Iterable, Iterator
+
+import metrics
 
 USERS_CSV = Path(__file__).parent / "users.csv"
+USERS_DB = Path(os.getenv("USERS_DB") or Path(__file__).parent / "users.db")
+ARCHIVE_DIR = Path(__file__).parent / "archive"
 
+logger = logging.getLogger(__name__)
 
-def save_user_record(user_id: int, username: str | None, intent: str) -> None:
-    first = not USERS_CSV.exists()
-    with USERS_CSV.open("a", encoding="utf-8-sig", newline="") as f:
-        writer = csv.writer(f)
-        if first:
-            writer.writerow(["user_id", "username", "intent", "timestamp"])
-        writer.writerow([user_id, username or "", intent, datetime.now(timezone.utc).isoformat()])
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    last_intent TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    intent TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interactions_user_id ON interactions (user_id);
+CREATE INDEX IF NOT EXISTS interactions_timestamp ON interactions (timestamp);
+CREATE INDEX IF NOT EXISTS users_first_seen ON users (first_seen);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
 
+_UPSERT_USER = """
+INSERT INTO users (user_id, username, last_intent, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    username = COALESCE(excluded.username, users.username),
+    last_intent = excluded.last_intent,
+    last_seen = excluded.last_seen
+"""
 
-def load_user_ids() -> list[int]:
-    """Return a list of user_ids recorded in USERS_CSV. If file missing, return empty list."""
-    if not USERS_CSV.exists():
-        return []
-    ids: list[int] = []
-    with USERS_CSV.open("r", encoding="utf-8-sig", newline="") as f:
+_conn: sqlite3.Connection | None = None
+_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the shared connection on first use, creating the schema and importing users.csv once."""
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(USERS_DB, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'csv_imported'").fetchone() is None:
+            import_users_csv(USERS_CSV, conn)
+        _conn = conn
+    return _conn
+
+
+def _insert_records(conn: sqlite3.Connection, records: list[tuple[int, str | None, str, str]]) -> None:
+    """Insert (user_id, username, intent, timestamp) rows and update each user's latest state."""
+    conn.executemany(
+        "INSERT INTO interactions (user_id, intent, timestamp) VALUES (?, ?, ?)",
+        [(uid, intent, ts) for uid, _, intent, ts in records],
+    )
+    conn.executemany(_UPSERT_USER, [(uid, name, intent, ts, ts) for uid, name, intent, ts in records])
+
+
+def _write_records(conn: sqlite3.Connection, records: list[tuple[int, str | None, str, str]]) -> None:
+    conn.execute("BEGIN")
+    try:
+        _insert_records(conn, records)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _parse_timestamp(value: str) -> datetime | None:
+    try:
+        ts = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    # early rows were written without an offset; they are UTC
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _utc_iso(value: datetime) -> str:
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).astimezone(timezone.utc).isoformat()
+
+
+def iter_csv_records(
+    path: Path = USERS_CSV,
+    intent: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> Iterator[tuple[int, str | None, str, str]]:
+    """Lazily yield (user_id, username, intent, timestamp) rows from a users.csv-style file.
+
+    Rows can be filtered by `intent` and by a [since, until) time range. Only one row
+    is held in memory at a time.
+    """
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
         reader = csv.reader(f)
-        headers = next(reader, None)
+        next(reader, None)
         for row in reader:
-            if not row:
+            if len(row) < 4:
                 continue
             try:
                 uid = int(row[0])
-            except Exception:
+            except ValueError:
                 continue
-            ids.append(uid)
-    # de-duplicate while preserving order
-    seen = set()
-    out: list[int] = []
-    for u in ids:
-        if u in seen:
-            continue
-        seen.add(u)
-        out.append(u)
-    return out
+            if intent is not None and row[2] != intent:
+                continue
+            if since is not None or until is not None:
+                ts = _parse_timestamp(row[3])
+                if ts is None or (since is not None and ts < since) or (until is not None and ts >= until):
+                    continue
+            yield (uid, row[1] or None, row[2], row[3])
+
+
+def iter_interactions(
+    intent: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    chunk_size: int = 1000,
+) -> Iterator[tuple[int, str | None, str, str]]:
+    """Lazily yield (user_id, username, intent, timestamp) interactions from the database.
+
+    Uses its own read connection (WAL readers do not block the writer) and fetches
+    `chunk_size` rows at a time. Filters are applied in SQL.
+    """
+    with _lock:
+        # make sure the schema exists and users.csv has been imported
+        _connect()
+    clauses, params = [], []
+    if intent is not None:
+        clauses.append("i.intent = ?")
+        params.append(intent)
+    if since is not None:
+        clauses.append("i.timestamp >= ?")
+        params.append(_utc_iso(since))
+    if until is not None:
+        clauses.append("i.timestamp < ?")
+        params.append(_utc_iso(until))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    conn = sqlite3.connect(USERS_DB)
+    try:
+        cur = conn.execute(
+            "SELECT i.user_id, u.username, i.intent, i.timestamp FROM interactions i "
+            f"LEFT JOIN users u ON u.user_id = i.user_id {where} ORDER BY i.id",
+            params,
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        conn.close()
+
+
+def iter_unique_user_ids(
+    records: Iterable[tuple[int, str | None, str, str]] | None = None, chunk_size: int = 10000
+) -> Iterator[int]:
+    """Yield each user_id once, in first-seen order, keeping only the set of seen ids.
+
+    Without `records` the ids are streamed from the users table, which keeps every
+    user even after compact_interactions() has removed their old interactions.
+    """
+    if records is None:
+        yield from _iter_user_table_ids(chunk_size)
+        return
+    seen: set[int] = set()
+    for record in records:
+        uid = record[0]
+        if uid not in seen:
+            seen.add(uid)
+            yield uid
+
+
+def _iter_user_table_ids(chunk_size: int) -> Iterator[int]:
+    conn = sqlite3.connect(USERS_DB)
+    try:
+        cur = conn.execute("SELECT user_id FROM users ORDER BY first_seen")
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            for (uid,) in rows:
+                yield uid
+    finally:
+        conn.close()
+
+
+def import_users_csv(path: Path = USERS_CSV, conn: sqlite3.Connection | None = None, chunk_size: int = 10000) -> int:
+    """One-time import of a legacy users.csv into the database. Returns the number of rows imported."""
+    conn = conn or _connect()
+    count = 0
+    chunk: list[tuple[int, str | None, str, str]] = []
+    conn.execute("BEGIN")
+    try:
+        for record in iter_csv_records(path):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                _insert_records(conn, chunk)
+                count += len(chunk)
+                chunk = []
+        _insert_records(conn, chunk)
+        count += len(chunk)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_imported', ?)", (str(count),))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return count
+
+
+def _make_record(user_id: int, username: str | None, intent: str) -> tuple[int, str | None, str, str]:
+    return (user_id, username or None, intent, datetime.now(timezone.utc).isoformat())
+
+
+def _save_records(records: list[tuple[int, str | None, str, str]]) -> None:
+    started = time.perf_counter()
+    with _lock:
+        _write_records(_connect(), records)
+    metrics.USERS_WRITE_SECONDS.labels().observe(time.perf_counter() - started)
+    metrics.USERS_WRITTEN.labels().inc(len(records))
+
+
+class UserIndex:
+    """Process-wide in-memory view of recorded users.
+
+    Maps user_id -> (latest intent, latest timestamp) in first-seen order. It is
+    built once with `load()` and then kept current by every recorded interaction,
+    so membership and distinct-user queries never touch the database.
+    """
+
+    def __init__(self):
+        self._latest: dict[int, tuple[str, str]] = {}
+        self.loaded = False
+        # load() runs in a worker thread while handlers keep calling update()
+        self._merge_lock = threading.Lock()
+
+    def load(self) -> None:
+        with _lock:
+            rows = _connect().execute("SELECT user_id, last_intent, last_seen FROM users ORDER BY first_seen").fetchall()
+        latest = {uid: (sys.intern(intent or ""), ts) for uid, intent, ts in rows}
+        with self._merge_lock:
+            # records that arrived while loading are newer than the database rows; users
+            # already in the database keep their first-seen position, new ones go last
+            latest.update(self._latest)
+            self._latest = latest
+        self.loaded = True
+
+    def update(self, record: tuple[int, str | None, str, str]) -> None:
+        uid, _, intent, ts = record
+        with self._merge_lock:
+            self._latest[uid] = (sys.intern(intent), ts)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._latest
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def ids(self) -> list[int]:
+        return list(self._latest)
+
+    def latest(self, user_id: int) -> tuple[str, str] | None:
+        """Return (intent, timestamp) of the user's most recent interaction, if any."""
+        return self._latest.get(user_id)
+
+
+user_index = UserIndex()
+
+
+def save_user_record(user_id: int, username: str | None, intent: str) -> None:
+    record = _make_record(user_id, username, intent)
+    user_index.update(record)
+    _save_records([record])
+
+
+# SQLite `synchronous` levels: "off" leaves syncing to the OS, "normal" syncs at WAL
+# checkpoints, "full" syncs every committed batch.
+FSYNC_POLICIES = ("off", "normal", "full")
+_STOP = object()
+
+
+class InteractionWriter:
+    """Write-behind queue for interaction records.
+
+    `enqueue()` never touches the disk; a background task drains the queue and writes
+    batches of up to `batch_size` records, or whatever arrived within `flush_interval`
+    seconds, in a worker thread.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 1.0, fsync: str = "normal"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def enqueue(self, user_id: int, username: str | None, intent: str) -> None:
+        record = _make_record(user_id, username, intent)
+        user_index.update(record)
+        if self._queue is None:
+            # not started (e.g. scripts): write through
+            _save_records([record])
+            return
+        self._queue.put_nowait(record)
+
+    async def start(self) -> None:
+        def _open() -> None:
+            with _lock:
+                _connect().execute(f"PRAGMA synchronous={self.fsync.upper()}")
+
+        await asyncio.to_thread(_open)
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write out everything still queued and stop the background task."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                try:
+                    if deadline is None:
+                        record = await self._queue.get()
+                        deadline = loop.time() + self.flush_interval
+                    else:
+                        record = await asyncio.wait_for(self._queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            if not batch:
+                continue
+            try:
+                await asyncio.to_thread(_save_records, batch)
+            except Exception:
+                logger.exception("Failed to write %d interaction records", len(batch))
+
+
+def load_user_ids() -> list[int]:
+    """Return distinct recorded user_ids in first-seen order."""
+    if user_index.loaded:
+        return user_index.ids()
+    with _lock:
+        rows = _connect().execute("SELECT user_id FROM users ORDER BY first_seen").fetchall()
+    return [r[0] for r in rows]
+
+
+def is_known_user(user_id: int) -> bool:
+    """Check the in-memory index, or fall back to a primary-key lookup before it is loaded."""
+    if user_index.loaded:
+        return user_id in user_index
+    with _lock:
+        row = _connect().execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    return row is not None
+
+
+def compact_interactions(retain_days: float = 30.0, archive_dir: Path | None = ARCHIVE_DIR, vacuum: bool = False) -> int:
+    """Fold old interaction history out of the live database.
+
+    The users table already holds the latest state per user, so interactions older
+    than `retain_days` are only history: they are streamed to a gzip CSV archive in
+    `archive_dir` (skipped when None) and deleted, leaving a short tail of recent
+    interactions. Returns the number of rows removed.
+    """
+    import gzip  # only needed here; kept off the bot's startup path
+
+    cutoff = _utc_iso(datetime.now(timezone.utc) - timedelta(days=retain_days))
+    with _lock:
+        conn = _connect()
+        (max_id,) = conn.execute("SELECT MAX(id) FROM interactions WHERE timestamp < ?", (cutoff,)).fetchone()
+    if max_id is None:
+        return 0
+    predicate = "WHERE id <= ? AND timestamp < ?"
+    if archive_dir is not None:
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        reader = sqlite3.connect(USERS_DB)
+        try:
+            cur = reader.execute(f"SELECT user_id, intent, timestamp FROM interactions {predicate} ORDER BY id", (max_id, cutoff))
+            with gzip.open(archive_dir / f"interactions-{stamp}.csv.gz", "wt", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["user_id", "intent", "timestamp"])
+                while True:
+                    rows = cur.fetchmany(1000)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+        finally:
+            reader.close()
+    with _lock:
+        removed = conn.execute(f"DELETE FROM interactions {predicate}", (max_id, cutoff)).rowcount
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if vacuum:
+            conn.execute("VACUUM")
+    logger.info("Compacted %d interactions older than %s", removed, cutoff)
+    return removed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact the interaction history in users.db")
+    parser.add_argument("--retain-days", type=float, default=30.0)
+    parser.add_argument("--no-archive", action="store_true", help="delete old rows without archiving them")
+    parser.add_argument("--vacuum", action="store_true", help="rebuild the database file afterwards")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    compact_interactions(args.retain_days, None if args.no_archive else ARCHIVE_DIR, args.vacuum)
@@ -0,0 +1,185 @@
+"""Webhook mode: receive updates over HTTP(S) and feed them to the Application.
+
+`WebhookReceiver` checks Telegram's secret-token header, decodes the update and
+puts it on `application.update_queue`, the same queue the polling Updater
+fills. Each connection is served in its own task, so updates are accepted in
+parallel and the Application's update processor handles them from there.
+
+`run_webhook()` drives the Application lifecycle around the receiver and falls
+back to polling if the webhook cannot be registered with Telegram.
+
+Recorded updates (one JSON object per line) can be replayed against a running
+receiver:
+
+    python webhook.py replay updates.jsonl --url http://127.0.0.1:8443/telegram --secret TOKEN
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+import signal
+from typing import Iterable, Optional
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import Application
+
+from httpserver import Request, Response, make_ssl_context, serve, text_response
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+class WebhookReceiver:
+    def __init__(self, application: Application, path: str = "/telegram", secret_token: Optional[str] = None):
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+
+    async def handle(self, request: Request) -> Response:
+        if request.path != self.path:
+            return text_response(404)
+        if request.method != "POST":
+            return text_response(405)
+        if self.secret_token is not None:
+            given = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(given.encode(), self.secret_token.encode()):
+                logger.warning("Rejected webhook request with a bad secret token from %s", request.peer)
+                return text_response(403)
+        try:
+            payload = json.loads(request.body)
+            # de_json expects an object; anything else would raise deep inside PTB
+            if not isinstance(payload, dict):
+                return text_response(400)
+            update = Update.de_json(payload, self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return text_response(400)
+        if update is None:
+            return text_response(400)
+        await self.application.update_queue.put(update)
+        return text_response(200)
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+async def run_webhook(
+    application: Application,
+    webhook_url: str,
+    listen: str = "0.0.0.0",
+    port: int = 8443,
+    path: str = "/telegram",
+    secret_token: Optional[str] = None,
+    certfile: Optional[str] = None,
+    keyfile: Optional[str] = None,
+    max_connections: int = 40,
+) -> None:
+    """Run `application` on a local webhook receiver until SIGINT/SIGTERM.
+
+    Mirrors `Application.run_polling()`: post_init, post_stop and post_shutdown are
+    called at the same points. If `setWebhook` fails, the receiver is closed and
+    the Updater polls instead.
+    """
+    if secret_token is None and not _is_loopback(listen):
+        logger.warning(
+            "Webhook receiver on %s accepts updates from anyone who finds it; set WEBHOOK_SECRET", listen
+        )
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    receiver = WebhookReceiver(application, path, secret_token)
+    ssl_context = make_ssl_context(certfile, keyfile) if certfile else None
+    server = await serve(receiver.handle, listen, port, ssl_context=ssl_context)
+    try:
+        await application.bot.set_webhook(
+            url=webhook_url,
+            secret_token=secret_token,
+            max_connections=max_connections,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logger.info("Webhook receiver listening on %s:%d%s", listen, port, path)
+    except TelegramError as e:
+        logger.warning("Could not set webhook (%s); falling back to polling", e)
+        server.close()
+        await server.wait_closed()
+        server = None
+        await application.updater.start_polling()
+    await application.start()
+    try:
+        await stop.wait()
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        if application.updater.running:
+            await application.updater.stop()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+async def replay_updates(
+    url: str, updates: Iterable[dict], secret_token: Optional[str] = None, concurrency: int = 8
+) -> dict:
+    """POST recorded updates to a webhook receiver, `concurrency` at a time, over the shared client."""
+    import httpclient
+
+    client = httpclient.get_client()
+    headers = {SECRET_HEADER: secret_token} if secret_token else {}
+    stats = {"accepted": 0, "rejected": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(update: dict) -> None:
+        async with semaphore:
+            response = await client.post(url, json=update, headers=headers)
+        stats["accepted" if response.status_code == 200 else "rejected"] += 1
+
+    await asyncio.gather(*(post(u) for u in updates))
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay recorded updates against a webhook receiver")
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay = sub.add_parser("replay")
+    replay.add_argument("file", help="JSON lines file with one Update per line")
+    replay.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    replay.add_argument("--secret")
+    replay.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    with open(args.file, encoding="utf-8") as f:
+        recorded = [json.loads(line) for line in f if line.strip()]
+
+    async def main() -> dict:
+        import httpclient
+
+        try:
+            return await replay_updates(args.url, recorded, args.secret, args.concurrency)
+        finally:
+            await httpclient.aclose()
+
+    print(asyncio.run(main()))